@@ -18,29 +18,234 @@
 ## along with this program; if not, see <http://www.gnu.org/licenses/>.
 ##
 
+import collections
+import instrumentation
+import numpy
 import qtcompat
 import re
 import sigrok.core as sr
+import threading
 import time
 
+try:
+    from gi.repository import GLib
+except ImportError:
+    GLib = None
+
 QtCore = qtcompat.QtCore
 
+'''The measurements of one channel from one packet. 'handle' is the integer
+handle of the channel (see 'Acquisition.channelAdded'), 'timestamps' and
+'values' are arrays with one element per sample. 'arrival' is the time the
+packet arrived in this process (the timestamps can be ahead of it), or
+'None' if unknown.'''
+Measurement = collections.namedtuple('Measurement',
+        ['handle', 'timestamps', 'values', 'unit', 'mqflags', 'arrival'])
+Measurement.__new__.__defaults__ = (None,)
+
+class ChannelInfo(object):
+    '''Description of a channel that doesn't depend on the sigrok objects.
+
+    'device' tells apart identical devices (with the same serial number and
+    connection id, like two demo devices) that run in isolated sessions, it
+    counts the ones attached before.'''
+
+    def __init__(self, vendor, model, serial_number, connection_id,
+            index, name, device=0):
+        self.vendor = vendor
+        self.model = model
+        self.serial_number = serial_number
+        self.connection_id = connection_id
+        self.index = index
+        self.name = name
+        self.device = device
+
+    @property
+    def uid(self):
+        '''Unique identifier for the device + channel.'''
+        return (self.vendor, self.model, self.serial_number,
+                self.connection_id, self.index, self.device)
+
+    @property
+    def description(self):
+        if self.device:
+            return '{} {} #{}, {}'.format(self.vendor, self.model,
+                    self.device + 1, self.name)
+        return '{} {}, {}'.format(self.vendor, self.model, self.name)
+
+# The connection id of USB devices is their port, "bus-port.port...".
+_USBPORT = re.compile(r'^\d+-\d+(\.\d+)*$')
+
+_IDENTITYFIELDS = ('vendor', 'model', 'connection_id', 'serial_number')
+
+def _conn(connection_id):
+    '''Returns the 'conn' option that finds a device at its connection
+    again, or 'None'.
+
+    The drivers only accept "VID.PID" or "bus.address" for USB devices, not
+    the port, and the address changes whenever the device is plugged in.'''
+    if not connection_id or _USBPORT.match(connection_id):
+        return None
+    return connection_id
+
+def device_identity(device):
+    '''Returns a dictionary (that can be serialized as JSON) identifying
+    a device, used to find it again without a full scan. It also contains
+    the 'conn' option to probe for the device, if there is one.'''
+    identity = {
+        'vendor': device.vendor,
+        'model': device.model,
+        'connection_id': device.connection_id(),
+        'serial_number': device.serial_number()
+    }
+    conn = _conn(identity['connection_id'])
+    if conn:
+        identity['conn'] = conn
+    return identity
+
+def _matches(device, identity):
+    '''Returns whether 'device' has the 'identity'.'''
+    if not identity:
+        return False
+    current = device_identity(device)
+    return all(current[f] == identity.get(f) for f in _IDENTITYFIELDS)
+
+class BatchStatistics(object):
+    '''Counters describing the batches sent by an 'Acquisition'.'''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.batches = 0
+        self.measurements = 0
+        self.samples = 0
+        self.last_size = 0
+        self.max_size = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    def add(self, size, samples, latency):
+        '''Records a batch of 'size' measurements with 'samples' samples in
+        total that was flushed 'latency' seconds after its first measurement
+        arrived.'''
+        self.batches += 1
+        self.measurements += size
+        self.samples += samples
+        self.last_size = size
+        self.max_size = max(self.max_size, size)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+
+    @property
+    def mean_size(self):
+        return self.measurements / float(self.batches) if self.batches else 0.0
+
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.batches if self.batches else 0.0
+
 class Acquisition(QtCore.QObject):
     '''Class that handles the sigrok session and the reception of data.'''
 
-    '''Signal emitted when new data arrived.'''
-    measured = QtCore.Signal(float, sr.classes.Device, sr.classes.Channel, tuple)
+    '''Signal emitted the first time data for a channel arrives. The
+    arguments are the integer handle used for the channel in the
+    measurements, and a 'ChannelInfo' object.'''
+    channelAdded = QtCore.Signal(int, object)
+
+    '''Signal emitted when new data arrived. The argument is a list of
+    'Measurement' objects, collected since the last time the signal was
+    emitted.'''
+    measured = QtCore.Signal(object)
 
     '''Signal emitted when the session has stopped.'''
     stopped = QtCore.Signal()
 
-    def __init__(self, context):
+    '''Signal emitted when a device failed while the devices are isolated
+    (the other devices keep running). The arguments are the description of
+    the device and the error message.'''
+    deviceError = QtCore.Signal(str, str)
+
+    # Used to flush and to report the end of the session from the thread
+    # the object lives in, so that the channels, batches and the end of the
+    # session are always signalled in order.
+    _flushRequested = QtCore.Signal()
+    _sessionStopped = QtCore.Signal()
+
+    # Maximum time in seconds a measurement is held back before the batch
+    # containing it is sent.
+    FLUSHINTERVAL = 0.05
+
+    # Number of samples after which a batch is sent immediately.
+    FLUSHSAMPLES = 4096
+
+    def __init__(self, context, flush_interval=None, flush_samples=None,
+            isolate=False):
+        '''Initializes the acquisition.
+
+        :param context: The sigrok context.
+        :param flush_interval: Overrides 'FLUSHINTERVAL'.
+        :param flush_samples: Overrides 'FLUSHSAMPLES'.
+        :param isolate: Run every device in its own session and thread, so
+            that a device that blocks or fails doesn't affect the others.
+            Every thread gets its own GLib main context if PyGObject is
+            available. Without it, the sessions fall back to the global
+            default context, which Qt may also use for its event loop (see
+            '_DeviceSession._run()').
+        '''
+
         super(self.__class__, self).__init__()
 
         self.context = context
-        self.session = self.context.create_session()
-        self.session.add_datafeed_callback(self._datafeed_callback)
-        self.session.set_stopped_callback(self._stopped_callback)
+        self.isolate = isolate
+
+        if isolate:
+            self.session = None
+            self._devices = []
+            self._running = 0
+        else:
+            self.session = self.context.create_session()
+            self.session.add_datafeed_callback(self._datafeed_callback)
+            self.session.set_stopped_callback(self._stopped_callback)
+
+        # Maps from the key of a device to its samplerate (or 'None' if it
+        # has none), and to the timestamp of its last sample.
+        self._samplerates = {}
+        self._last_timestamp = {}
+
+        # Maps from '(device key, channel index)' to the channel's handle.
+        # The devices may send data from different threads.
+        self._handles = {}
+        self._handles_lock = threading.Lock()
+
+        self.flush_interval = flush_interval or Acquisition.FLUSHINTERVAL
+        self.flush_samples = flush_samples or Acquisition.FLUSHSAMPLES
+        self.statistics = BatchStatistics()
+
+        # The measurements that are not sent yet. The data feed callback may
+        # be called from a thread other than the one the object lives in.
+        self._lock = threading.Lock()
+        self._pending = []
+        self._pending_samples = 0
+        self._pending_since = None
+        self._flush_requested = False
+
+        # Channels seen for the first time, as '(handle, ChannelInfo)'.
+        # They are signalled right before the batch with their first
+        # measurements.
+        self._pending_channels = []
+
+        self._flushRequested.connect(self.flush)
+        self._sessionStopped.connect(self._session_stopped)
+
+        # Sends out measurements that would otherwise be held back until the
+        # next packet arrives.
+        self._flush_timer = QtCore.QTimer(self)
+        self._flush_timer.setInterval(int(self.flush_interval * 1000))
+        self._flush_timer.timeout.connect(self.flush)
+        self.stopped.connect(self._flush_timer.stop)
 
     def _parse_configstring(self, cs):
         '''Dissect a config string and return the options as a dictionary.'''
@@ -83,8 +288,18 @@ class Acquisition(QtCore.QObject):
         opts = m.group('opts')[1:]
         return (m.group('name'), self._parse_configstring(opts))
 
-    def add_device(self, driverstring, configstring):
-        '''Add a device to the session.'''
+    def open_device(self, driverstring, configstring, cached=None):
+        '''Scans for the device described by the strings, configures and
+        opens it. Returns the device, which can then be added to the session
+        with 'attach()'.
+
+        'cached' is the 'device_identity()' of the device found the last
+        time. If given, the device is first looked for only at its old
+        connection (if that can be passed to the driver), and only if it
+        isn't found there all connections are scanned.
+
+        This can take a while and may be called from another thread. It
+        must not be called concurrently for the same driver.'''
 
         # Process driver string.
         (name, opts) = self._parse_driverstring(driverstring)
@@ -92,52 +307,423 @@ class Acquisition(QtCore.QObject):
             raise RuntimeError('No driver named "{}".'.format(name))
 
         driver = self.context.drivers[name]
-        devs = driver.scan(**opts)
-        if not devs:
-            raise RuntimeError('No devices found.')
 
-        device = devs[0]
+        device = None
+        if cached and cached.get('conn') and not 'conn' in opts:
+            device = self._probe(driver, opts, cached)
+
+        if device is None:
+            devs = driver.scan(**opts)
+            if not devs:
+                raise RuntimeError('No devices found.')
+
+            # Prefer the device that was used the last time.
+            found = [d for d in devs if _matches(d, cached)]
+            device = found[0] if found else devs[0]
 
         # Process configuration string.
         cfgs = self._parse_configstring(configstring)
         for k, v in cfgs.items():
             device.config_set(sr.ConfigKey.get_by_identifier(k), v)
 
-        self.session.add_device(device)
         device.open()
+        return device
+
+    def _probe(self, driver, opts, cached):
+        '''Scans only the connection of the cached device. Returns the
+        device if it's still the same, otherwise 'None'.'''
+
+        opts = dict(opts)
+        opts['conn'] = cached['conn']
+        try:
+            devs = driver.scan(**opts)
+        except Exception:
+            return None
+
+        found = [d for d in devs if _matches(d, cached)]
+        return found[0] if found else None
+
+    def attach(self, device):
+        '''Adds an opened device to the session. If the session is running,
+        the device starts sending data immediately.'''
+
+        if not self.isolate:
+            # The shared session can't tell identical devices apart.
+            self._samplerates[self._device_key(device)] = \
+                self._get_samplerate(device)
+            self.session.add_device(device)
+            return
+
+        key = self._device_key(device)
+        key = self._device_key(device, sum(1 for ds in self._devices
+                if ds.key[:-1] == key[:-1]))
+        self._samplerates[key] = self._get_samplerate(device)
+
+        ds = _DeviceSession(self, device, key)
+        self._devices.append(ds)
+        if self.is_running():
+            self._start_device(ds)
+
+    def add_device(self, driverstring, configstring, cached=None):
+        '''Add a device to the session. Returns the device.'''
+        device = self.open_device(driverstring, configstring, cached)
+        self.attach(device)
+        return device
+
+    def _device_key(self, device, number=0):
+        '''Returns a hashable key identifying the device. 'number' tells
+        apart identical devices (see 'ChannelInfo.device').'''
+        return (device.vendor, device.model, device.serial_number(),
+                device.connection_id(), number)
+
+    def _get_samplerate(self, device):
+        '''Returns the samplerate of the device, or 'None' if the device
+        doesn't have a (known) samplerate.'''
+        try:
+            rate = device.config_get(sr.ConfigKey.SAMPLERATE)
+        except:
+            return None
+        return float(rate) if rate else None
+
+    def _timestamps(self, key, now, n):
+        '''Returns the timestamps for the 'n' samples of a packet that arrived
+        at 'now'. The last sample is assigned the arrival time, the others are
+        spaced by the samplerate of the device. For devices without a
+        samplerate the samples are spread evenly over the time since the
+        previous packet.
+
+        The timestamps of a device never decrease (the buffers rely on
+        that): a packet that arrives early, so that it would overlap the
+        previous one, continues right after it instead.'''
+
+        rate = self._samplerates.get(key)
+        last = self._last_timestamp.get(key)
+
+        if rate:
+            end = now
+            if last is not None:
+                end = max(end, last + n / rate)
+            ts = end - numpy.arange(n - 1, -1, -1) / rate
+        elif last is None or n == 1:
+            ts = numpy.full(n, now if last is None else max(now, last))
+        else:
+            ts = numpy.linspace(last, max(now, last), n + 1)[1:]
+
+        self._last_timestamp[key] = ts[-1]
+        return ts
 
     def is_running(self):
         '''Return whether the session is running.'''
+        if self.isolate:
+            with self._lock:
+                return self._running > 0
         return self.session.is_running()
 
     @QtCore.Slot()
     def start(self):
         '''Start the session.'''
-        self.session.start()
+        if self.isolate:
+            if not self._devices:
+                raise RuntimeError('No devices to start.')
+            for ds in self._devices:
+                self._start_device(ds)
+        else:
+            self.session.start()
+        self._flush_timer.start()
 
     @QtCore.Slot()
     def stop(self):
         '''Stop the session.'''
-        if self.is_running():
+        if not self.is_running():
+            return
+        if self.isolate:
+            for ds in self._devices:
+                ds.stop()
+        else:
             self.session.stop()
 
-    def _datafeed_callback(self, device, packet):
+    def _start_device(self, ds):
+        with self._lock:
+            self._running += 1
+        ds.start()
+
+    def _device_stopped(self, ds, error):
+        '''Called from the thread of an isolated device after it stopped.'''
+
+        if error:
+            self.deviceError.emit(ds.description, error)
+
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+
+        if last:
+            self._stopped_callback()
+
+    @QtCore.Slot()
+    def flush(self):
+        '''Sends all measurements that are not sent yet. Must be called
+        from the thread the object lives in.'''
+
+        with self._lock:
+            channels = self._pending_channels
+            batch = self._pending
+            samples = self._pending_samples
+            since = self._pending_since
+            self._pending_channels = []
+            self._pending = []
+            self._pending_samples = 0
+            self._pending_since = None
+            self._flush_requested = False
+            if batch:
+                self.statistics.add(len(batch), samples, time.time() - since)
+
+        for handle, info in channels:
+            self.channelAdded.emit(handle, info)
+        if batch:
+            self.measured.emit(batch)
+
+    def _get_handle(self, device, devkey, channel):
+        '''Returns the handle for a channel, registers the channel if it is
+        seen for the first time.'''
+
+        key = (devkey, channel.index)
+        handle = self._handles.get(key)
+        if handle is not None:
+            return handle
+
+        with self._handles_lock:
+            handle = self._handles.get(key)
+            if handle is None:
+                handle = len(self._handles)
+                self._handles[key] = handle
+                info = ChannelInfo(device.vendor, device.model,
+                        device.serial_number(), device.connection_id(),
+                        channel.index, channel.name, devkey[-1])
+                with self._lock:
+                    self._pending_channels.append((handle, info))
+        return handle
+
+    def _datafeed_callback(self, device, packet, devkey=None):
         now = time.time()
 
         if packet.type != sr.PacketType.ANALOG:
             return
 
-        if not len(packet.payload.channels):
+        channels = packet.payload.channels
+        if not len(channels):
             return
 
-        # TODO: Find a device with multiple channels in one packet.
-        channel = packet.payload.channels[0]
-
-        # The most recent value.
-        value = packet.payload.data[0][-1]
+        # All samples of all channels of the packet, the array returned by
+        # the bindings is used directly.
+        values = numpy.asarray(packet.payload.data, dtype=numpy.float64)
+        values = values.reshape(len(channels), -1)
+        if not values.shape[1]:
+            return
 
-        self.measured.emit(now, device, channel,
-                (value, packet.payload.unit, packet.payload.mq_flags))
+        if devkey is None:
+            devkey = self._device_key(device)
+        timestamps = self._timestamps(devkey, now, values.shape[1])
+        unit = packet.payload.unit
+        mqflags = packet.payload.mq_flags
+
+        measurements = [
+            Measurement(self._get_handle(device, devkey, channel),
+                timestamps, chvalues, unit, mqflags, now)
+            for channel, chvalues in zip(channels, values)
+        ]
+
+        with self._lock:
+            if not self._pending:
+                self._pending_since = now
+            self._pending.extend(measurements)
+            self._pending_samples += values.size
+            full = (self._pending_samples >= self.flush_samples or
+                    now - self._pending_since >= self.flush_interval)
+            request = full and not self._flush_requested
+            if request:
+                self._flush_requested = True
+
+        if request:
+            # Queued to the thread of the object.
+            self._flushRequested.emit()
+
+        stats = instrumentation.pipeline
+        stats.count('packets', 1, now)
+        stats.count('samples', values.size, now)
+        stats.record('callback', time.time() - now, now)
 
     def _stopped_callback(self, **kwargs):
+        self._sessionStopped.emit()
+
+    @QtCore.Slot()
+    def _session_stopped(self):
+        self.flush()
         self.stopped.emit()
+
+class _DeviceSession(object):
+    '''A session with a single device, run in its own thread.'''
+
+    def __init__(self, acquisition, device, key):
+        self.description = '{} {}'.format(device.vendor, device.model)
+
+        # The key of the device in the acquisition, passed with its data.
+        self.key = key
+
+        self._acquisition = acquisition
+        self._session = acquisition.context.create_session()
+        self._session.add_datafeed_callback(self._datafeed_callback)
+        self._session.add_device(device)
+        self._thread = None
+        self._stop_requested = False
+
+    def _datafeed_callback(self, device, packet):
+        self._acquisition._datafeed_callback(device, packet, self.key)
+
+    def start(self):
+        self._stop_requested = False
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop_requested = True
+        try:
+            self._session.stop()
+        except Exception:
+            # The session already stopped (or never started).
+            pass
+
+    def _run(self):
+        # libsigrok runs the session on the thread-default GLib main
+        # context. Unless a private one is pushed here, that is the global
+        # default context, which is shared with the other sessions and
+        # with Qt if it uses the GLib event dispatcher: the device's
+        # callbacks could then run on the GUI thread.
+        context = None
+        if GLib is not None:
+            context = GLib.MainContext.new()
+            context.push_thread_default()
+
+        error = None
+        try:
+            self._session.start()
+            if self._stop_requested:
+                # 'stop()' was called before the session was started.
+                self._session.stop()
+            self._session.run()
+        except Exception as e:
+            error = str(e)
+        finally:
+            if context is not None:
+                context.pop_thread_default()
+        self._acquisition._device_stopped(self, error)
+
+class _OpenTask(QtCore.QRunnable):
+    '''Opens the devices of one driver, one after the other.'''
+
+    def __init__(self, acquisition, opener, items):
+        super(self.__class__, self).__init__()
+        self.setAutoDelete(False)
+
+        self._acquisition = acquisition
+        self._opener = opener
+        self._items = items
+
+    def run(self):
+        for (n, ds, cs, cached) in self._items:
+            try:
+                device = self._acquisition.open_device(ds, cs, cached)
+            except Exception as e:
+                self._opener._failed.emit(n, str(e))
+            else:
+                self._opener._opened.emit(n, device)
+
+class DeviceOpener(QtCore.QObject):
+    '''Scans for and opens devices on a thread pool, without blocking the
+    thread the object lives in.
+
+    The devices of different drivers are opened concurrently, the devices
+    of the same driver one after the other (the drivers don't expect to be
+    used from multiple threads at once).
+    '''
+
+    '''Signal emitted when a device was opened. The arguments are the driver
+    string and the device, which can be passed to 'Acquisition.attach()'.'''
+    opened = QtCore.Signal(str, object)
+
+    '''Signal emitted when a device couldn't be opened. The arguments are
+    the driver string and the error message.'''
+    failed = QtCore.Signal(str, str)
+
+    '''Signal emitted after every device, with the number of devices that
+    were handled and the total number of devices.'''
+    progress = QtCore.Signal(int, int)
+
+    '''Signal emitted when all devices were handled.'''
+    finished = QtCore.Signal()
+
+    # Used to pass the results from the worker threads, the arguments are
+    # the index of the device and the device or error message.
+    _opened = QtCore.Signal(int, object)
+    _failed = QtCore.Signal(int, str)
+
+    def __init__(self, acquisition, drivers, cache=None, pool=None):
+        '''Initializes the opener.
+
+        :param acquisition: The 'Acquisition' used to open the devices.
+        :param drivers: List of '(driverstring, configstring)' tuples.
+        :param cache: Dictionary mapping from a driver string to the
+            'device_identity()' of the device found the last time.
+        :param pool: The 'QThreadPool' to use, the global one by default.
+        '''
+
+        super(self.__class__, self).__init__()
+
+        self._acquisition = acquisition
+        self._drivers = list(drivers)
+        self._cache = cache or {}
+        self._pool = pool or QtCore.QThreadPool.globalInstance()
+        self._tasks = []
+        self._done = 0
+
+        self._opened.connect(self._on_opened)
+        self._failed.connect(self._on_failed)
+
+    def start(self):
+        '''Starts opening the devices.'''
+
+        if not self._drivers:
+            self.finished.emit()
+            return
+
+        # Group the devices by driver.
+        groups = collections.OrderedDict()
+        for n, (ds, cs) in enumerate(self._drivers):
+            name = ds.split(':', 1)[0]
+            groups.setdefault(name, []).append(
+                (n, ds, cs, self._cache.get(ds)))
+
+        self._pool.setMaxThreadCount(max(self._pool.maxThreadCount(),
+            len(groups)))
+        for items in groups.values():
+            task = _OpenTask(self._acquisition, self, items)
+            self._tasks.append(task)
+            self._pool.start(task)
+
+    def _advance(self):
+        self._done += 1
+        self.progress.emit(self._done, len(self._drivers))
+        if self._done == len(self._drivers):
+            self._tasks = []
+            self.finished.emit()
+
+    @QtCore.Slot(int, object)
+    def _on_opened(self, n, device):
+        self.opened.emit(self._drivers[n][0], device)
+        self._advance()
+
+    @QtCore.Slot(int, str)
+    def _on_failed(self, n, message):
+        self.failed.emit(self._drivers[n][0], message)
+        self._advance()
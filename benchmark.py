@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+'''End-to-end throughput benchmark.
+
+Feeds the packets of a fake device through the 'Acquisition', the
+'MeasurementDataModel' and the plots of the 'MainWindow', and prints the
+results as JSON:
+
+  samples_per_second  Samples that reached the data model per second.
+  latency             Percentiles (in seconds) of the stages:
+                        delivery   From the arrival of a packet until the
+                                   data model receives it.
+                        model      Time spent in the data model's update.
+                        render     Time spent updating the plots.
+                        display    From the arrival of a packet until the
+                                   plots are updated with it.
+  peak_rss_kib        Peak resident set size of the process.
+
+The libsigrok Python bindings are still needed (for the units), but no
+hardware is used.
+'''
+
+import argparse
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+class FakeChannel(object):
+    def __init__(self, index):
+        self.index = index
+        self.name = 'P{}'.format(index + 1)
+
+class FakeDevice(object):
+    '''A device with 'channels' channels, sending 'rate' packets per second
+    with 'spp' samples per channel.'''
+
+    vendor = 'Benchmark'
+    model = 'Fake'
+
+    def __init__(self, channels, rate, spp):
+        self.channels = [FakeChannel(i) for i in range(channels)]
+        self.rate = rate
+        self.spp = spp
+
+    def serial_number(self):
+        return ''
+
+    def connection_id(self):
+        return 'fake'
+
+    def config_get(self, key):
+        if key != sr.ConfigKey.SAMPLERATE:
+            raise KeyError(key)
+        return self.rate * self.spp
+
+    def config_set(self, key, value):
+        pass
+
+    def open(self):
+        pass
+
+class FakePayload(object):
+    def __init__(self, channels, data):
+        self.channels = channels
+        self.data = data
+        self.unit = sr.Unit.VOLT
+        self.mq_flags = [sr.QuantityFlag.DC]
+
+class FakePacket(object):
+    def __init__(self, payload):
+        self.type = sr.PacketType.ANALOG
+        self.payload = payload
+
+class FakeSession(object):
+    '''Calls the data feed callback from a separate thread, like the
+    libsigrok session does.'''
+
+    def __init__(self):
+        self._devices = []
+        self._datafeed = None
+        self._stopped = None
+        self._thread = None
+        self._stop = threading.Event()
+        self.packets = 0
+        self.samples = 0
+
+    def add_datafeed_callback(self, callback):
+        self._datafeed = callback
+
+    def set_stopped_callback(self, callback):
+        self._stopped = callback
+
+    def add_device(self, device):
+        self._devices.append(device)
+
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        rate = max(d.rate for d in self._devices)
+
+        # Precomputed waveforms (a sine and some noise), the packets are
+        # slices of them.
+        periods = {}
+        for d in self._devices:
+            n = len(d.channels)
+            t = numpy.arange(d.spp * 64) / float(d.spp * 16)
+            wave = numpy.sin(2 * numpy.pi * t)
+            noise = numpy.random.uniform(-0.01, 0.01, (n, len(t)))
+            periods[d] = wave + noise + numpy.arange(n)[:, None]
+
+        start = time.time()
+        i = 0
+        while not self._stop.is_set():
+            delay = start + i / float(rate) - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            for d in self._devices:
+                k = (i % 64) * d.spp
+                data = periods[d][:, k:k + d.spp]
+                self._datafeed(d, FakePacket(FakePayload(d.channels, data)))
+                self.packets += 1
+                self.samples += data.size
+            i += 1
+
+        self._stopped()
+
+class FakeDriver(object):
+    def __init__(self, channels, rate, spp):
+        self._args = (channels, rate, spp)
+
+    def scan(self, **opts):
+        return [FakeDevice(*self._args)]
+
+class FakeContext(object):
+    def __init__(self, channels, rate, spp):
+        self.drivers = {'fake': FakeDriver(channels, rate, spp)}
+        self.session = None
+
+    def create_session(self):
+        self.session = FakeSession()
+        return self.session
+
+    def set_log_callback(self, callback):
+        pass
+
+class Stage(object):
+    '''Collects the latencies of one stage of the pipeline.'''
+
+    def __init__(self):
+        self.values = []
+
+    def add(self, value):
+        self.values.append(value)
+
+    def summary(self):
+        if not self.values:
+            return {'count': 0}
+        v = numpy.array(self.values)
+        p = numpy.percentile(v, [50, 90, 99])
+        return {
+            'count': len(v),
+            'mean': float(v.mean()),
+            'p50': float(p[0]),
+            'p90': float(p[1]),
+            'p99': float(p[2]),
+            'max': float(v.max())
+        }
+
+def instrument(stages):
+    '''Wraps the methods of the pipeline so that they record their
+    latencies.'''
+
+    # Arrival time of the oldest packet that is not drawn yet.
+    pending = [None]
+    samples = [0]
+
+    update = datamodel.MeasurementDataModel.update
+    def timed_update(model, batch):
+        start = time.time()
+        arrival = min(m.arrival for m in batch)
+        stages['delivery'].add(start - arrival)
+        if pending[0] is None:
+            pending[0] = arrival
+        update(model, batch)
+        stages['model'].add(time.time() - start)
+        samples[0] += sum(len(m.values) for m in batch)
+    datamodel.MeasurementDataModel.update = timed_update
+
+    update_plots = mainwindow.MainWindow._updatePlots
+    def timed_update_plots(window):
+        start = time.time()
+        update_plots(window)
+        end = time.time()
+        stages['render'].add(end - start)
+        if pending[0] is not None:
+            stages['display'].add(end - pending[0])
+            pending[0] = None
+    mainwindow.MainWindow._updatePlots = timed_update_plots
+
+    return samples
+
+def parse_cli():
+    parser = argparse.ArgumentParser(
+        description='Throughput benchmark for sigrok-meter.')
+    parser.add_argument('--channels',
+        type=int,
+        default=4,
+        help='Number of channels of the fake device (default is 4)')
+    parser.add_argument('--rate',
+        type=float,
+        default=100,
+        help='Packets per second (default is 100)')
+    parser.add_argument('--samples-per-packet',
+        type=int,
+        default=10,
+        help='Samples per channel in each packet (default is 10)')
+    parser.add_argument('--duration',
+        type=float,
+        default=10,
+        help='Duration of the benchmark in seconds (default is 10)')
+    parser.add_argument('-o', '--output',
+        default=None,
+        help='File the results are written to (default is stdout)')
+    parser.add_argument('--pyside',
+        action='store_true',
+        default=False,
+        help='Force use of PySide (default is to use PyQt4)')
+    args = parser.parse_args()
+
+    if args.channels < 1 or args.rate <= 0 or args.samples_per_packet < 1:
+        sys.exit('Error: The channels, rate and samples must be positive.')
+
+    return args
+
+if __name__ == '__main__':
+    args = parse_cli()
+
+    # No window has to be shown, but it must be drawn.
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+    import qtcompat
+    qtcompat.load_modules(args.pyside)
+    QtCore = qtcompat.QtCore
+    QtGui = qtcompat.QtGui
+
+    app = QtGui.QApplication([])
+
+    import numpy
+    import sigrok.core as sr
+
+    import settings
+    settings.init()
+
+    import acquisition
+    import datamodel
+    import mainwindow
+
+    stages = dict((s, Stage())
+            for s in ('delivery', 'model', 'render', 'display'))
+    received = instrument(stages)
+
+    context = FakeContext(args.channels, args.rate, args.samples_per_packet)
+    acq = acquisition.Acquisition(context)
+    acq.add_device('fake', '')
+
+    window = mainwindow.MainWindow(context, [], source=acq)
+    window.show()
+
+    acq.stopped.connect(app.quit)
+    QtCore.QTimer.singleShot(int(args.duration * 1000), acq.stop)
+
+    start = time.time()
+    app.exec_()
+    elapsed = time.time() - start
+
+    # 'ru_maxrss' is in bytes on OS X, in kilobytes elsewhere.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss //= 1024
+
+    results = {
+        'channels': args.channels,
+        'rate': args.rate,
+        'samples_per_packet': args.samples_per_packet,
+        'duration': elapsed,
+        'packets': context.session.packets,
+        'samples_generated': context.session.samples,
+        'samples_received': received[0],
+        'samples_per_second': received[0] / elapsed,
+        'latency': dict((k, s.summary()) for k, s in stages.items()),
+        'peak_rss_kib': rss
+    }
+
+    text = json.dumps(results, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
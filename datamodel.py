@@ -17,10 +17,13 @@
 ## along with this program; if not, see <http://www.gnu.org/licenses/>.
 ##
 
+import history
+import instrumentation
 import itertools
-import math
+import numpy
 import qtcompat
-import sigrok.core as sr
+import runningstats
+import time
 import util
 
 try:
@@ -35,14 +38,82 @@ class Trace(object):
     '''Class to hold the measured samples.'''
 
     def __init__(self):
-        self.samples = []
+        self.history = history.History()
         self.new = False
 
-    def append(self, sample):
-        self.samples.append(sample)
+        # The number of samples added so far.
+        self.count = 0
+
+        # Statistics of the samples added since the start or the last
+        # reset, independent of how many samples are kept.
+        self.statistics = runningstats.RunningStatistics()
+
+    @property
+    def timestamps(self):
+        '''View of the timestamps of the samples kept at full rate.'''
+        return self.history.raw.column(0)
+
+    @property
+    def values(self):
+        '''View of the values of the samples kept at full rate.'''
+        return self.history.raw.column(1)
+
+    def append(self, timestamp, value):
+        self.extend([timestamp], [value])
+
+    def extend(self, timestamps, values):
+        '''Appends a block of samples. Non-finite values (overloads) are
+        only counted in the statistics, they can't be drawn.'''
+
+        self.statistics.add(values)
+
+        timestamps = numpy.asarray(timestamps, dtype=numpy.float64)
+        values = numpy.asarray(values, dtype=numpy.float64)
+        valid = numpy.isfinite(values)
+        if not valid.all():
+            timestamps = timestamps[valid]
+            values = values[valid]
+        if not len(values):
+            return
+
+        self.history.extend(timestamps, values)
+        self.count += len(timestamps)
         self.new = True
 
-class MeasurementDataModel(QtGui.QStandardItemModel):
+    def trim(self, timestamp):
+        '''Removes all samples older than 'timestamp'.'''
+        self.history.trim(timestamp)
+
+    def select(self, x0, x1, width):
+        '''Returns the arrays '(x, y)' to draw the range 'x0' to 'x1' with
+        'width' pixels, see 'History.select()'.'''
+        return self.history.select(x0, x1, width)
+
+class Row(object):
+    '''The data of a single row (device + channel) of the
+    'MeasurementDataModel'.'''
+
+    def __init__(self, uid, desc, color):
+        self.uid = uid
+        self.desc = desc
+        self.color = color
+
+        # The text shown for the most recent value, a tuple containing the
+        # value and the unit/flags.
+        self.display = ('', '')
+
+        # The most recent '(value, unit, mqflags)', not yet formatted into
+        # 'display', or 'None'.
+        self.latest = None
+
+        # The two lines of text shown for the statistics of the trace with
+        # the unit of the most recent value.
+        self.summary = ('', '')
+
+        # Dictionary that contains the samples for each unit.
+        self.traces = {}
+
+class MeasurementDataModel(QtCore.QAbstractListModel):
     '''Model to hold the measured values.'''
 
     '''Role used to identify and find the item.'''
@@ -57,16 +128,39 @@ class MeasurementDataModel(QtGui.QStandardItemModel):
     '''Role used to store the color to draw the graph of the channel.'''
     colorRole = QtCore.Qt.UserRole + 4
 
+    '''Role used to store the formatted statistics of the channel.'''
+    summaryRole = QtCore.Qt.UserRole + 5
+
+    # Minimum time between two updates of the displayed values in
+    # milliseconds.
+    FRAMEINTERVAL = 16
+
     def __init__(self, parent):
         super(self.__class__, self).__init__(parent)
 
-        # Use the description text to sort the items for now, because the
-        # idRole holds tuples, and using them to sort doesn't work.
-        self.setSortRole(MeasurementDataModel.descRole)
-
         # A generator for the colors of the channels.
         self._colorgen = self._make_colorgen()
 
+        # The rows in the order they were added.
+        self._rows = []
+
+        # Maps from the unique identifier of a channel to its row number.
+        self._index = {}
+
+        # Maps from the handle of a channel to its 'Row'.
+        self._handles = {}
+
+        # Samples older than this many seconds are removed.
+        self._backlog = None
+
+        # Numbers of the rows whose display must be updated. The view is
+        # updated at most once per frame, with the latest value of each row.
+        self._dirty = set()
+        self._frame_timer = QtCore.QTimer(self)
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.setInterval(MeasurementDataModel.FRAMEINTERVAL)
+        self._frame_timer.timeout.connect(self._refresh_display)
+
     def _make_colorgen(self):
         cols = [
             QtGui.QColor(0x8F, 0x52, 0x02), # brown
@@ -90,90 +184,169 @@ class MeasurementDataModel(QtGui.QStandardItemModel):
         for c, d in izip(colorcycle, darkness):
             yield QtGui.QColor(c).darker(d)
 
-    def format_mqflags(self, mqflags):
-        if sr.QuantityFlag.AC in mqflags:
-            return 'AC'
-        elif sr.QuantityFlag.DC in mqflags:
-            return 'DC'
+    def rows(self):
+        '''Returns the list of 'Row' objects, must not be modified.'''
+        return self._rows
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._rows)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+
+        row = self._rows[index.row()]
+        if role == QtCore.Qt.DisplayRole:
+            return row.display
+        elif role == MeasurementDataModel.idRole:
+            return row.uid
+        elif role == MeasurementDataModel.descRole:
+            return row.desc
+        elif role == MeasurementDataModel.tracesRole:
+            return row.traces
+        elif role == MeasurementDataModel.colorRole:
+            return row.color
+        elif role == MeasurementDataModel.summaryRole:
+            return row.summary
+        return None
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return False
+
+        row = self._rows[index.row()]
+        if role == MeasurementDataModel.colorRole:
+            row.color = value
+        elif role == MeasurementDataModel.tracesRole:
+            row.traces = value
         else:
-            return ''
-
-    def format_value(self, mag):
-        if math.isinf(mag):
-            return u'\u221E'
-        return '{:f}'.format(mag)
-
-    def getItem(self, device, channel):
-        '''Return the item for the device + channel combination from the
-        model, or create a new item if no existing one matches.'''
-
-        # Unique identifier for the device + channel.
-        # TODO: Isn't there something better?
-        uid = (
-            device.vendor,
-            device.model,
-            device.serial_number(),
-            device.connection_id(),
-            channel.index
-        )
-
-        # Find the correct item in the model.
-        for row in range(self.rowCount()):
-            item = self.item(row)
-            rid = item.data(MeasurementDataModel.idRole)
-            rid = tuple(rid) # PySide returns a list.
-            if uid == rid:
-                return item
-
-        # Nothing found, create a new item.
-        desc = '{} {}, {}'.format(
-                device.vendor, device.model, channel.name)
-
-        item = QtGui.QStandardItem()
-        item.setData(uid, MeasurementDataModel.idRole)
-        item.setData(desc, MeasurementDataModel.descRole)
-        item.setData({}, MeasurementDataModel.tracesRole)
-        item.setData(next(self._colorgen), MeasurementDataModel.colorRole)
-        self.appendRow(item)
-        self.sort(0)
-        return item
-
-    @QtCore.Slot(float, sr.classes.Device, sr.classes.Channel, tuple)
-    def update(self, timestamp, device, channel, data):
-        '''Update the data for the device (+channel) with the most recent
-        measurement from the given payload.'''
-
-        item = self.getItem(device, channel)
-
-        value, unit, mqflags = data
-        value_str = self.format_value(value)
-        unit_str = util.format_unit(unit)
-        mqflags_str = self.format_mqflags(mqflags)
-
-        # The display role is a tuple containing the value and the unit/flags.
-        disp = (value_str, ' '.join([unit_str, mqflags_str]))
-        item.setData(disp, QtCore.Qt.DisplayRole)
-
-        # The samples role is a dictionary that contains the old samples for each unit.
-        # Should be trimmed periodically, otherwise it grows larger and larger.
-        if not math.isinf(value) and not math.isnan(value):
-            sample = (timestamp, value)
-            traces = item.data(MeasurementDataModel.tracesRole)
-
-            # It's not possible to use 'collections.defaultdict' here, because
-            # PySide doesn't return the original type that was passed in.
-            if not (unit in traces):
-                traces[unit] = Trace()
-            traces[unit].append(sample)
-
-            item.setData(traces, MeasurementDataModel.tracesRole)
+            return False
+
+        self.dataChanged.emit(index, index)
+        return True
+
+    def _getRow(self, info):
+        '''Return the row number for the channel described by the
+        'ChannelInfo' object, create a new row if no existing one matches.'''
+
+        uid = info.uid
+        n = self._index.get(uid)
+        if n is not None:
+            return n
+
+        # Nothing found, append a new row.
+        n = len(self._rows)
+        self.beginInsertRows(QtCore.QModelIndex(), n, n)
+        self._rows.append(Row(uid, info.description, next(self._colorgen)))
+        self._index[uid] = n
+        self.endInsertRows()
+        return n
+
+    @QtCore.Slot(int, object)
+    def add_channel(self, handle, info):
+        '''Registers the handle used for a channel in the measurements.'''
+        self._handles[handle] = self._rows[self._getRow(info)]
+
+    def _update_row(self, row, m):
+        '''Update the data of a row with the samples of a single
+        measurement.'''
+
+        # The display shows the most recent value, it is formatted when the
+        # view is updated.
+        row.latest = (m.values[-1], m.unit, m.mqflags)
+
+        if not (m.unit in row.traces):
+            row.traces[m.unit] = Trace()
+        trace = row.traces[m.unit]
+        trace.extend(m.timestamps, m.values)
+
+        # Remove old samples, otherwise the traces grow larger and larger.
+        if self._backlog is not None:
+            trace.trim(m.timestamps[-1] - self._backlog)
+
+    @QtCore.Slot(int)
+    def set_backlog(self, seconds):
+        '''Sets the number of seconds the samples are kept.'''
+        self._backlog = seconds
+
+    @QtCore.Slot(object)
+    def update(self, batch):
+        '''Update the data with a batch of measurements (a list of
+        'acquisition.Measurement' objects).'''
+
+        if not batch:
+            return
+
+        start = time.time()
+        stats = instrumentation.pipeline
+        arrivals = [m.arrival for m in batch if m.arrival is not None]
+        if arrivals:
+            stats.delivered(min(arrivals), start)
+
+        for m in batch:
+            row = self._handles.get(m.handle)
+            if row is None:
+                # The channel was never announced.
+                continue
+            self._update_row(row, m)
+            self._dirty.add(self._index[row.uid])
+
+        stats.record('model', time.time() - start, start)
+
+        if self._dirty and not self._frame_timer.isActive():
+            self._frame_timer.start()
+
+    @QtCore.Slot()
+    def _refresh_display(self):
+        '''Formats the latest values of all changed rows and notifies the
+        views with a single signal.'''
+
+        if not self._dirty:
+            return
+
+        for n in self._dirty:
+            row = self._rows[n]
+            if row.latest is None:
+                continue
+            row.display = util.format_measurement(*row.latest)
+
+            unit = row.latest[1]
+            trace = row.traces.get(unit)
+            if trace is None:
+                row.summary = ('', '')
+            else:
+                row.summary = util.format_statistics(trace.statistics, unit)
+
+        first = min(self._dirty)
+        last = max(self._dirty)
+        self._dirty = set()
+        self.dataChanged.emit(self.index(first, 0), self.index(last, 0))
+
+    def statistics(self, uid):
+        '''Returns a dictionary mapping from the units of the channel with
+        the unique identifier 'uid' to the 'RunningStatistics' of its
+        samples.'''
+        row = self._rows[self._index[uid]]
+        return dict((unit, trace.statistics)
+                for unit, trace in row.traces.items())
+
+    @QtCore.Slot()
+    def reset_statistics(self):
+        '''Restarts the statistics of all channels, the samples are kept.'''
+        for n, row in enumerate(self._rows):
+            for trace in row.traces.values():
+                trace.statistics.reset()
+            self._dirty.add(n)
+
+        if self._dirty and not self._frame_timer.isActive():
+            self._frame_timer.start()
 
     def clear_samples(self):
         '''Removes all old samples from the model.'''
-        for row in range(self.rowCount()):
-            idx = self.index(row, 0)
-            self.setData(idx, {},
-                MeasurementDataModel.tracesRole)
+        for row in self._rows:
+            row.traces = {}
 
 class MultimeterDelegate(QtGui.QStyledItemDelegate):
     '''Delegate to show the data items from a MeasurementDataModel.'''
@@ -191,11 +364,19 @@ class MultimeterDelegate(QtGui.QStyledItemDelegate):
         fi = QtGui.QFontInfo(self._nfont)
         self._nfontheight = fi.pixelSize()
 
+        # Smaller font for the statistics.
+        self._sfont = QtGui.QFont(font)
+        if font.pointSizeF() > 0:
+            self._sfont.setPointSizeF(font.pointSizeF() * 0.8)
+        else:
+            self._sfont.setPixelSize(int(font.pixelSize() * 0.8))
+        self._sfontheight = QtGui.QFontInfo(self._sfont).pixelSize()
+
         fm = QtGui.QFontMetrics(self._nfont)
         r = fm.boundingRect('-XX.XXXXXX X XX')
 
         w = 1.4 * r.width() + 2 * self._nfontheight
-        h = 2.6 * self._nfontheight
+        h = 2.6 * self._nfontheight + 2.4 * self._sfontheight
         self._size = QtCore.QSize(w, h)
 
     def sizeHint(self, option=None, index=None):
@@ -203,7 +384,7 @@ class MultimeterDelegate(QtGui.QStyledItemDelegate):
 
     def _color_rect(self, outer):
         '''Returns the dimensions of the clickable rectangle.'''
-        x1 = (outer.height() - self._nfontheight) / 2
+        x1 = int(0.8 * self._nfontheight)
         r = QtCore.QRect(x1, x1, self._nfontheight, self._nfontheight)
         r.translate(outer.topLeft())
         return r
@@ -212,18 +393,24 @@ class MultimeterDelegate(QtGui.QStyledItemDelegate):
         value, unit = index.data(QtCore.Qt.DisplayRole)
         desc = index.data(MeasurementDataModel.descRole)
         color = index.data(MeasurementDataModel.colorRole)
+        summary = index.data(MeasurementDataModel.summaryRole)
 
         painter.setFont(self._nfont)
 
         # Draw the clickable rectangle.
         painter.fillRect(self._color_rect(options.rect), color)
 
-        # Draw the text
-        h = options.rect.height()
+        # Draw the text, the statistics below the value.
         p = options.rect.topLeft()
-        p += QtCore.QPoint(h, (h + self._nfontheight) / 2 - 2)
+        p += QtCore.QPoint(int(2.6 * self._nfontheight),
+                int(1.8 * self._nfontheight) - 2)
         painter.drawText(p, desc + ': ' + value + ' ' + unit)
 
+        painter.setFont(self._sfont)
+        for line in summary:
+            p += QtCore.QPoint(0, int(1.2 * self._sfontheight))
+            painter.drawText(p, line)
+
     def editorEvent(self, event, model, options, index):
         if type(event) is QtGui.QMouseEvent:
             if event.type() == QtCore.QEvent.MouseButtonPress:
@@ -235,8 +422,8 @@ class MultimeterDelegate(QtGui.QStyledItemDelegate):
                     if c.isValid():
                         # False if cancel is pressed (resulting in a black
                         # color).
-                        item = model.itemFromIndex(index)
-                        item.setData(c, MeasurementDataModel.colorRole)
+                        model.setData(index, c,
+                                MeasurementDataModel.colorRole)
 
                     return True
 
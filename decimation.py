@@ -0,0 +1,146 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import math
+import numpy
+import ringbuffer
+
+def minmax(x, y, x0, x1, width):
+    '''Reduces the curve '(x, y)' for drawing it 'width' pixels wide.
+
+    Only the samples in the range 'x0' to 'x1' (plus one sample on either
+    side, so that the curve reaches the border) are used. If there are more
+    samples than pixel columns, each column is represented by two points,
+    the minimum and the maximum of all samples falling into it. Unlike simple
+    subsampling this keeps spikes visible.
+
+    The columns are aligned to multiples of their width (and not to 'x0'),
+    so the result for already known samples doesn't change when the range
+    is only moved. 'width' doesn't have to be an integer.
+
+    'x' must be sorted in ascending order. Returns the tuple '(x, y)' of
+    arrays to draw.
+    '''
+
+    lo = max(numpy.searchsorted(x, x0, side='left') - 1, 0)
+    hi = min(numpy.searchsorted(x, x1, side='right') + 1, len(x))
+    x = x[lo:hi]
+    y = y[lo:hi]
+
+    if len(x) <= 2 * width or x1 <= x0 or width <= 0:
+        return x, y
+
+    # Pixel column of every sample, and the start of every run of samples
+    # falling into the same column.
+    col = numpy.floor(x * (width / float(x1 - x0))).astype(numpy.int64)
+    starts = numpy.flatnonzero(numpy.diff(col)) + 1
+    starts = numpy.concatenate(([0], starts))
+    ends = numpy.concatenate((starts[1:], [len(x)])) - 1
+
+    mins = numpy.minimum.reduceat(y, starts)
+    maxs = numpy.maximum.reduceat(y, starts)
+
+    # Interleave the minimum (at the start of the column) and the maximum
+    # (at its end).
+    xs = numpy.empty(2 * len(starts))
+    ys = numpy.empty(2 * len(starts))
+    xs[0::2] = x[starts]
+    xs[1::2] = x[ends]
+    ys[0::2] = mins
+    ys[1::2] = maxs
+    return xs, ys
+
+class ScrollingDecimator(object):
+    '''Keeps the decimated points of a curve whose visible range scrolls.
+
+    As long as the width of a pixel column doesn't change, only the columns
+    that received new samples are computed again, the points of the older
+    columns are reused. The points are stored relative to 'offset', so they
+    can be drawn without further processing.
+    '''
+
+    def __init__(self, select, offset=0.0):
+        '''Initializes the decimator.
+
+        :param select: Function called as 'select(x0, x1, width)' that
+            returns the decimated arrays '(x, y)' for a range, like
+            'minmax()' does.
+        :param offset: Subtracted from the x coordinates of the points.
+        '''
+
+        self._select = select
+        self._offset = offset
+        self._points = ringbuffer.RingBuffer(columns=2)
+
+        # Width of a pixel column, and the start of the range that the
+        # points cover.
+        self._colwidth = None
+        self._x0 = None
+
+    def reset(self):
+        '''Forgets all points.'''
+        self._colwidth = None
+        self._points.clear()
+
+    def valid(self, x0, x1, width):
+        '''Returns whether the points can be updated incrementally for the
+        range 'x0' to 'x1'.'''
+        if self._colwidth is None or width <= 0:
+            return False
+        cw = (x1 - x0) / float(width)
+        return (abs(cw - self._colwidth) <= 1e-9 * cw and
+                x0 >= self._x0 - self._colwidth)
+
+    def update(self, x0, x1, width):
+        '''Updates the points for the range 'x0' to 'x1' drawn with 'width'
+        pixels, and returns views '(x, y)' of them.'''
+
+        if width <= 0 or x1 <= x0:
+            return self._views()
+
+        cw = (x1 - x0) / float(width)
+        if not self.valid(x0, x1, width):
+            x, y = self._select(x0, x1, width)
+            self._points.clear()
+            self._points.extend(x - self._offset, y)
+            self._colwidth = cw
+            self._x0 = x0
+            return self._views()
+
+        # Compute the last (possibly incomplete) column and everything after
+        # it again.
+        xs = self._points.column(0)
+        tail = x0
+        if len(xs):
+            tail = max(math.floor((xs[-1] + self._offset) / cw) * cw, x0)
+
+        if x1 > tail:
+            x, y = self._select(tail, x1, (x1 - tail) / cw)
+            keep = x >= tail
+            self._points.truncate(tail - self._offset)
+            self._points.extend(x[keep] - self._offset, y[keep])
+
+        # Drop the points that scrolled out of view, but keep one column
+        # so the curve still reaches the border.
+        self._points.trim(x0 - cw - self._offset)
+        self._x0 = max(self._x0, x0)
+        return self._views()
+
+    def _views(self):
+        return self._points.column(0), self._points.column(1)
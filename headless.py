@@ -0,0 +1,207 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import acquisition
+import io
+import json
+import math
+import qtcompat
+import settings
+import signal
+import sys
+import util
+
+QtCore = qtcompat.QtCore
+
+def _csv_field(s):
+    '''Quotes a string for use in a CSV file, if necessary.'''
+    if any(c in s for c in ',"\n'):
+        return '"' + s.replace('"', '""') + '"'
+    return s
+
+class StreamWriter(QtCore.QObject):
+    '''Writes the measurements of an 'Acquisition' to a file.'''
+
+    '''Signal emitted when the requested number of samples was written.'''
+    done = QtCore.Signal()
+
+    def __init__(self, f, fmt='csv', maxsamples=None):
+        '''Initializes the writer.
+
+        :param f: The file object the measurements are written to.
+        :param fmt: Either 'csv' or 'jsonl' (one JSON object per line).
+        :param maxsamples: Number of samples after which the writer stops,
+            or 'None'.
+        '''
+
+        super(self.__class__, self).__init__()
+
+        if not fmt in ('csv', 'jsonl'):
+            raise ValueError('Unknown output format "{}".'.format(fmt))
+
+        self._f = f
+        self._fmt = fmt
+        self._remaining = maxsamples
+
+        # Maps from the handle of a channel to its description.
+        self._channels = {}
+
+        if fmt == 'csv':
+            self._f.write(u'time,channel,value,unit,flags\n')
+
+    @QtCore.Slot(int, object)
+    def add_channel(self, handle, info):
+        self._channels[handle] = info.description
+
+    @QtCore.Slot(object)
+    def write(self, batch):
+        '''Writes a batch of measurements.'''
+
+        if self._remaining == 0:
+            return
+
+        lines = []
+        for m in batch:
+            desc = self._channels.get(m.handle)
+            if desc is None:
+                # The channel was never announced.
+                continue
+            unit = util.format_unit(m.unit)
+            flags = util.format_mqflags(m.mqflags)
+
+            n = len(m.values)
+            if self._remaining is not None:
+                n = min(n, self._remaining)
+                self._remaining -= n
+
+            for t, v in zip(m.timestamps[:n], m.values[:n]):
+                lines.append(self._format(t, desc, v, unit, flags))
+
+            if self._remaining == 0:
+                break
+
+        self._f.write(u''.join(lines))
+        self._f.flush()
+
+        if self._remaining == 0:
+            self.done.emit()
+
+    def _format(self, t, desc, v, unit, flags):
+        v = float(v)
+        if self._fmt == 'csv':
+            return u'{:.6f},{},{!r},{},{}\n'.format(t, _csv_field(desc), v,
+                    _csv_field(unit), flags)
+
+        # JSON has no representation for infinity and NaN.
+        if math.isinf(v) or math.isnan(v):
+            v = None
+        return json.dumps({
+            'time': round(t, 6),
+            'channel': desc,
+            'value': v,
+            'unit': unit,
+            'flags': flags
+        }, ensure_ascii=False) + u'\n'
+
+def run(context, drivers, output=None, fmt='csv', duration=None,
+        samples=None, sinks=(), source=None):
+    '''Runs an acquisition without any widgets and writes the measurements to
+    'output' (a filename, or stdout if 'None'), and to the 'sinks' (see
+    'MainWindow').
+
+    If 'source' is given, it is used instead of an acquisition with the
+    devices in 'drivers' (see 'MainWindow').
+
+    The acquisition stops after 'duration' seconds or after 'samples' samples
+    were written, whichever comes first, or when interrupted (SIGINT or
+    SIGTERM). A
+    QCoreApplication must exist. Returns the exit code.
+    '''
+
+    app = QtCore.QCoreApplication.instance()
+
+    if output:
+        f = io.open(output, 'w', encoding='utf-8')
+    else:
+        f = io.open(sys.stdout.fileno(), 'w', encoding='utf-8', closefd=False)
+
+    with f:
+        writer = StreamWriter(f, fmt, samples)
+
+        acq = source
+        if acq is None:
+            acq = acquisition.Acquisition(context,
+                isolate=settings.acquisition.isolate.value())
+        else:
+            drivers = []
+
+        if hasattr(acq, 'deviceError'):
+            acq.deviceError.connect(lambda desc, message: sys.stderr.write(
+                'Error: {} stopped: {}\n'.format(desc, message)))
+
+        acq.channelAdded.connect(writer.add_channel)
+        acq.measured.connect(writer.write)
+        acq.stopped.connect(app.quit)
+        writer.done.connect(acq.stop)
+
+        for sink in sinks:
+            acq.channelAdded.connect(sink.add_channel)
+            acq.measured.connect(sink.write)
+            acq.stopped.connect(sink.close)
+
+        try:
+            cache = dict(settings.devices.scancache.value())
+            for (ds, cs) in drivers:
+                device = acq.add_device(ds, cs, cache.get(ds))
+                cache[ds] = acquisition.device_identity(device)
+            settings.devices.scancache.setValue(cache)
+        except Exception as e:
+            sys.stderr.write('Error: {}\n'.format(e))
+            return 1
+
+        if duration is not None:
+            QtCore.QTimer.singleShot(int(duration * 1000), acq.stop)
+
+        # Interrupting stops the acquisition like the other conditions, so
+        # that the sinks are closed and the settings written. A second
+        # interrupt quits without waiting for the devices.
+        interrupted = []
+        def interrupt(signum, frame):
+            if interrupted:
+                app.quit()
+                return
+            interrupted.append(signum)
+            acq.stop()
+
+        handlers = [(s, signal.signal(s, interrupt))
+                for s in (signal.SIGINT, signal.SIGTERM)]
+
+        # Python only runs the handlers when it gets control, not while Qt
+        # waits for events.
+        timer = QtCore.QTimer()
+        timer.timeout.connect(lambda: None)
+        timer.start(200)
+
+        try:
+            acq.start()
+            return app.exec_()
+        finally:
+            timer.stop()
+            for s, handler in handlers:
+                signal.signal(s, handler)
@@ -0,0 +1,244 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import decimation
+import numpy
+import ringbuffer
+
+class Tier(object):
+    '''Samples rolled up into buckets of a fixed width.
+
+    Every bucket stores its start time, the minimum, maximum and mean of the
+    values in it, and the number of samples that went into it. Only complete
+    buckets are stored, the bucket currently being filled is kept separately.
+    '''
+
+    # Column indices.
+    TIME, MIN, MAX, MEAN, COUNT = range(5)
+
+    def __init__(self, width, maxbuckets=None):
+        '''Initializes the tier.
+
+        :param width: Width of a bucket in seconds.
+        :param maxbuckets: Maximum number of buckets to keep, 'None' keeps
+            everything until it is trimmed.
+        '''
+
+        self.width = float(width)
+        self.buckets = ringbuffer.RingBuffer(columns=5, capacity=256,
+                maxcapacity=maxbuckets)
+
+        # The bucket being filled: (id, min, max, sum, count).
+        self._open = None
+
+    def __len__(self):
+        return len(self.buckets)
+
+    def clear(self):
+        self.buckets.clear()
+        self._open = None
+
+    def column(self, i):
+        return self.buckets.column(i)
+
+    def end(self):
+        '''Returns the end time of the newest complete bucket, or 'None'.'''
+        if not len(self.buckets):
+            return None
+        return self.buckets.column(Tier.TIME)[-1] + self.width
+
+    def add(self, t, mins, maxs, sums, counts):
+        '''Adds samples (or buckets of a finer tier), given as arrays of their
+        times, minimums, maximums, sums and counts.
+
+        Returns the buckets that were completed in the same format, so they
+        can be passed on to the next coarser tier.
+        '''
+
+        ids = numpy.floor(t / self.width)
+
+        if self._open is not None:
+            oid, omin, omax, osum, ocount = self._open
+            ids = numpy.concatenate(([oid], ids))
+            mins = numpy.concatenate(([omin], mins))
+            maxs = numpy.concatenate(([omax], maxs))
+            sums = numpy.concatenate(([osum], sums))
+            counts = numpy.concatenate(([ocount], counts))
+
+        starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(ids)) + 1))
+        ids = ids[starts]
+        mins = numpy.minimum.reduceat(mins, starts)
+        maxs = numpy.maximum.reduceat(maxs, starts)
+        sums = numpy.add.reduceat(sums, starts)
+        counts = numpy.add.reduceat(counts, starts)
+
+        # The last bucket may still receive samples.
+        self._open = (ids[-1], mins[-1], maxs[-1], sums[-1], counts[-1])
+
+        done = (ids[:-1] * self.width, mins[:-1], maxs[:-1], sums[:-1],
+                counts[:-1])
+        if len(done[0]):
+            self.buckets.extend(done[0], done[1], done[2],
+                    done[3] / done[4], done[4])
+        return done
+
+    def trim(self, t):
+        '''Removes all buckets that end before 't'.'''
+        self.buckets.trim(t - self.width)
+
+class History(object):
+    '''Multi-resolution store for the samples of a trace.
+
+    The most recent samples are kept at full rate, older data is only
+    available as the buckets of progressively coarser tiers.
+    '''
+
+    # Seconds of data kept at full rate.
+    RAWSECONDS = 900
+
+    # Upper limit for the number of samples kept at full rate.
+    MAXSAMPLES = 1 << 20
+
+    # Width in seconds and maximum number of buckets of each tier.
+    TIERS = (
+        (1,    6 * 3600),               # 6 hours
+        (10,   2 * 24 * 3600 // 10),    # 2 days
+        (60,   7 * 24 * 60),            # 7 days
+        (600,  None),
+    )
+
+    def __init__(self):
+        self.raw = ringbuffer.RingBuffer(columns=2,
+                maxcapacity=History.MAXSAMPLES)
+        self.tiers = [Tier(w, n) for (w, n) in History.TIERS]
+
+        # Timestamp of the first sample ever added, used to decide if a
+        # level still holds all data at the beginning of a range.
+        self._first = None
+
+    def clear(self):
+        self.raw.clear()
+        for tier in self.tiers:
+            tier.clear()
+        self._first = None
+
+    def extend(self, timestamps, values):
+        '''Appends a block of samples (sorted by time).'''
+
+        if not len(timestamps):
+            return
+        if self._first is None:
+            self._first = timestamps[0]
+
+        self.raw.extend(timestamps, values)
+
+        values = numpy.asarray(values, dtype=numpy.float64)
+        data = (numpy.asarray(timestamps, dtype=numpy.float64), values,
+                values, values, numpy.ones(len(values)))
+        for tier in self.tiers:
+            if not len(data[0]):
+                break
+            data = tier.add(*data)
+
+        # Keep the full rate data only for a limited time.
+        self.raw.trim(self.raw.column(0)[-1] - History.RAWSECONDS)
+
+    def trim(self, t):
+        '''Removes all data older than 't'.'''
+        self.raw.trim(t)
+        for tier in self.tiers:
+            tier.trim(t)
+
+    def _levels(self):
+        '''Returns the levels from fine to coarse as tuples of the time
+        column and the tier ('None' for the full rate samples).'''
+        return [(self.raw.column(0), None)] + \
+            [(tier.column(Tier.TIME), tier) for tier in self.tiers]
+
+    def _covers(self, times, t):
+        '''Returns whether a level with the time column 'times' holds all data
+        starting at 't'.'''
+        if not len(times):
+            return False
+        return times[0] <= max(t, self._first)
+
+    def select(self, x0, x1, width):
+        '''Returns the arrays '(x, y)' to draw the range 'x0' to 'x1' with
+        'width' pixels.
+
+        The level is selected by the zoom level, the newest part of the
+        range that the coarse tiers don't hold yet is filled in from the
+        finer levels.
+        '''
+
+        if self._first is None or width <= 0 or x1 <= x0:
+            return numpy.empty(0), numpy.empty(0)
+        colwidth = (x1 - x0) / float(width)
+
+        # Use the coarsest tier that still has at least one bucket per pixel
+        # column, or the full rate samples if there is none. If that level
+        # doesn't reach back far enough, use the finest one that does.
+        levels = self._levels()
+        start = None
+        for i in reversed(range(len(levels))):
+            times, tier = levels[i]
+            if tier is not None and tier.width > colwidth:
+                continue
+            if self._covers(times, x0):
+                start = i
+                break
+        if start is None:
+            start = len(levels) - 1
+            for i, (times, tier) in enumerate(levels):
+                if self._covers(times, x0):
+                    start = i
+                    break
+
+        xs = []
+        ys = []
+        cursor = x0
+        for times, tier in reversed(levels[:start + 1]):
+            if tier is None:
+                lo, hi = self.raw.range(cursor, x1)
+                lo = max(lo - 1, 0)
+                xs.append(times[lo:hi])
+                ys.append(self.raw.column(1)[lo:hi])
+                break
+
+            lo, hi = tier.buckets.range(cursor - tier.width, x1)
+            if hi <= lo:
+                continue
+
+            # Draw each bucket as its minimum and maximum.
+            t = times[lo:hi]
+            x = numpy.empty(2 * len(t))
+            y = numpy.empty(2 * len(t))
+            x[0::2] = t
+            x[1::2] = t + tier.width / 2
+            y[0::2] = tier.column(Tier.MIN)[lo:hi]
+            y[1::2] = tier.column(Tier.MAX)[lo:hi]
+            xs.append(x)
+            ys.append(y)
+            cursor = tier.end()
+
+        if not xs:
+            return numpy.empty(0), numpy.empty(0)
+
+        return decimation.minmax(numpy.concatenate(xs), numpy.concatenate(ys),
+                x0, x1, width)
@@ -18,12 +18,23 @@
 ##
 
 import qtcompat
-import resources
 
 QtCore = qtcompat.QtCore
 QtGui = qtcompat.QtGui
 
+# The icons that were already loaded.
+_icons = {}
+
+def load_resources():
+    '''Makes the compiled resources available, loading them the first time.
+
+    A QApplication must have been created before this function can be called.
+    '''
+    import resources
+
 def _load_icon(name):
+    load_resources()
+
     icon = QtGui.QIcon()
 
     nameFilters = ['{}-*'.format(name)]
@@ -32,18 +43,14 @@ def _load_icon(name):
         filename = it.next()
         icon.addFile(filename)
 
-    globals()[name] = icon
+    return icon
 
-def load_icons():
-    '''Loads all available icons in all sizes from the resource file.
+def get(name):
+    '''Returns the icon 'name' in all available sizes, it is loaded from the
+    resources the first time it is used.
 
     A QApplication must have been created before this function can be called.
     '''
-    _load_icon('about')
-    _load_icon('add')
-    _load_icon('exit')
-    _load_icon('graph')
-    _load_icon('log')
-    _load_icon('preferences')
-    _load_icon('start')
-    _load_icon('stop')
+    if not name in _icons:
+        _icons[name] = _load_icon(name)
+    return _icons[name]
@@ -0,0 +1,266 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+'''Latency and throughput statistics of the measurement pipeline.
+
+The stages of the pipeline record into the module-level 'pipeline' object:
+
+  callback  Time spent in the data feed callback of the acquisition.
+  delivery  From the arrival of a packet in the callback until the batch
+            containing it reaches the data model.
+  model     Time spent updating the data model with a batch.
+  display   From the arrival of a packet until the plot update that first
+            shows it is done.
+  render    Time spent updating the plots.
+'''
+
+import collections
+import math
+import numpy
+import threading
+import time
+
+class RollingHistogram(object):
+    '''Histogram of the values recorded in the last 'window' seconds.
+
+    The buckets are spaced logarithmically from 'MINIMUM' to 'MAXIMUM',
+    smaller and larger values are counted in the first and last bucket.
+    '''
+
+    MINIMUM = 1e-6
+    MAXIMUM = 100.0
+    BUCKETSPERDECADE = 10
+
+    def __init__(self, window=60):
+        decades = int(round(math.log10(RollingHistogram.MAXIMUM /
+                RollingHistogram.MINIMUM)))
+        n = decades * RollingHistogram.BUCKETSPERDECADE
+
+        self.window = window
+        self.edges = numpy.logspace(math.log10(RollingHistogram.MINIMUM),
+                math.log10(RollingHistogram.MAXIMUM), n + 1)
+
+        # One row of counts per second, and the second each row holds.
+        self._counts = numpy.zeros((window, n), dtype=numpy.int64)
+        self._seconds = numpy.full(window, -1, dtype=numpy.int64)
+
+    def _row(self, now):
+        s = int(now)
+        i = s % self.window
+        if self._seconds[i] != s:
+            self._counts[i] = 0
+            self._seconds[i] = s
+        return i
+
+    def add(self, value, now):
+        i = numpy.searchsorted(self.edges, value, side='right') - 1
+        i = min(max(i, 0), len(self.edges) - 2)
+        self._counts[self._row(now), i] += 1
+
+    def counts(self, now):
+        '''Returns the counts of all buckets.'''
+        valid = self._seconds > int(now) - self.window
+        return self._counts[valid].sum(axis=0)
+
+    def clear(self):
+        self._counts[:] = 0
+        self._seconds[:] = -1
+
+    def percentile(self, counts, p):
+        '''Returns the upper edge of the bucket containing the percentile
+        'p' (from 0 to 100) of 'counts', or 'None' if it is empty.'''
+
+        total = counts.sum()
+        if not total:
+            return None
+        cum = numpy.cumsum(counts)
+        i = numpy.searchsorted(cum, total * p / 100.0, side='left')
+        return float(self.edges[i + 1])
+
+class RateCounter(object):
+    '''Counts events per second over the last 'window' seconds.'''
+
+    def __init__(self, window=60):
+        self.window = window
+        self.total = 0
+        self._counts = numpy.zeros(window, dtype=numpy.int64)
+        self._seconds = numpy.full(window, -1, dtype=numpy.int64)
+
+    def add(self, n, now):
+        s = int(now)
+        i = s % self.window
+        if self._seconds[i] != s:
+            self._counts[i] = 0
+            self._seconds[i] = s
+        self._counts[i] += n
+        self.total += n
+
+    def rate(self, now):
+        '''Returns the count of the last complete second.'''
+        s = int(now) - 1
+        i = s % self.window
+        return int(self._counts[i]) if self._seconds[i] == s else 0
+
+    def clear(self):
+        self.total = 0
+        self._counts[:] = 0
+        self._seconds[:] = -1
+
+class Pipeline(object):
+    '''Statistics of all stages of the pipeline.'''
+
+    '''Names and descriptions of the latencies.'''
+    STAGES = collections.OrderedDict([
+        ('callback', 'Data feed callback'),
+        ('delivery', 'Delivery to the data model'),
+        ('model', 'Data model update'),
+        ('display', 'Arrival until shown'),
+        ('render', 'Plot update')
+    ])
+
+    '''Names and descriptions of the counters.'''
+    COUNTERS = collections.OrderedDict([
+        ('packets', 'Packets'),
+        ('samples', 'Samples'),
+        ('batches', 'Batches'),
+        ('renders', 'Plot updates')
+    ])
+
+    def __init__(self, window=60):
+        self.window = window
+        self.histograms = dict((k, RollingHistogram(window))
+                for k in Pipeline.STAGES)
+        self.counters = dict((k, RateCounter(window))
+                for k in Pipeline.COUNTERS)
+
+        # The stages run in different threads.
+        self._lock = threading.Lock()
+
+        # Arrival times of the batches that were not shown yet. Not
+        # collected while the display is paused.
+        self._unshown = []
+        self._display_paused = False
+
+    def record(self, stage, value, now=None):
+        '''Records a latency (in seconds) of a stage.'''
+        now = now or time.time()
+        with self._lock:
+            self.histograms[stage].add(value, now)
+
+    def count(self, counter, n=1, now=None):
+        now = now or time.time()
+        with self._lock:
+            self.counters[counter].add(n, now)
+
+    def delivered(self, arrival, now=None):
+        '''Records that a batch whose oldest packet arrived at 'arrival'
+        reached the data model.'''
+        now = now or time.time()
+        with self._lock:
+            self.histograms['delivery'].add(now - arrival, now)
+            self.counters['batches'].add(1, now)
+            if not self._display_paused:
+                self._unshown.append(arrival)
+
+    def rendered(self, now=None):
+        '''Records that the plots were updated, showing all batches
+        delivered so far.'''
+        now = now or time.time()
+        with self._lock:
+            for arrival in self._unshown:
+                self.histograms['display'].add(now - arrival, now)
+            self._unshown = []
+            self.counters['renders'].add(1, now)
+
+    def set_display_paused(self, paused):
+        '''Tells whether the plot updates are paused (e.g. while the window
+        is minimized). No display latencies are recorded for the batches
+        delivered meanwhile, they would only measure the pause.'''
+        with self._lock:
+            self._display_paused = paused
+            if paused:
+                self._unshown = []
+
+    def clear(self):
+        with self._lock:
+            for h in self.histograms.values():
+                h.clear()
+            for c in self.counters.values():
+                c.clear()
+            self._unshown = []
+
+    def snapshot(self, now=None):
+        '''Returns the current statistics as a dictionary (that can be
+        serialized as JSON).'''
+
+        now = now or time.time()
+        result = {
+            'time': now,
+            'window': self.window,
+            'stages': {},
+            'counters': {}
+        }
+
+        with self._lock:
+            for k, h in self.histograms.items():
+                counts = h.counts(now)
+                stage = {
+                    'count': int(counts.sum()),
+                    'edges': h.edges.tolist(),
+                    'histogram': counts.tolist()
+                }
+                for p in (50, 90, 99, 100):
+                    stage['p{}'.format(p)] = h.percentile(counts, p)
+                result['stages'][k] = stage
+
+            for k, c in self.counters.items():
+                result['counters'][k] = {
+                    'rate': c.rate(now),
+                    'total': c.total
+                }
+
+        return result
+
+class PhaseTimer(object):
+    '''Measures how long the consecutive phases of a process (like the
+    startup of the program) take.'''
+
+    def __init__(self, start=None):
+        '''Initializes the timer, the first phase begins at 'start'.'''
+        self._start = start or time.time()
+        self._last = self._start
+        self.phases = []
+
+    def mark(self, name):
+        '''Ends the phase 'name', the next phase begins now.'''
+        now = time.time()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def report(self, f):
+        '''Writes the duration of every phase to the file object 'f'.'''
+        width = max([len(name) for name, _ in self.phases] + [5])
+        for name, duration in self.phases:
+            f.write('{:<{}} {:8.1f} ms\n'.format(name, width,
+                duration * 1000))
+        f.write('{:<{}} {:8.1f} ms\n'.format('total', width,
+            (self._last - self._start) * 1000))
+
+'''The statistics of the running program.'''
+pipeline = Pipeline()
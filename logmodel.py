@@ -0,0 +1,179 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import qtcompat
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+QtCore = qtcompat.QtCore
+
+class LogModel(QtCore.QAbstractListModel):
+    '''List model holding the most recent log messages.
+
+    Messages can be added from any thread. They are collected and added to
+    the model at most once per frame, and the oldest messages are dropped
+    once 'capacity' messages are stored.
+    '''
+
+    # Minimum time in milliseconds between two updates of the views.
+    FRAMEINTERVAL = 16
+
+    # Used to start the timer in the thread the model lives in.
+    _wake = QtCore.Signal()
+
+    def __init__(self, capacity, parent=None):
+        super(self.__class__, self).__init__(parent)
+
+        self._capacity = max(capacity, 1)
+
+        # The messages are stored in a ring, the list grows until it holds
+        # 'capacity' messages. Row 'i' is at '(start + i) % len(lines)'.
+        self._lines = []
+        self._start = 0
+        self._count = 0
+
+        self._lock = threading.Lock()
+        self._pending = []
+
+        self._frame_timer = QtCore.QTimer(self)
+        self._frame_timer.setSingleShot(True)
+        self._frame_timer.setInterval(LogModel.FRAMEINTERVAL)
+        self._frame_timer.timeout.connect(self._flush)
+        self._wake.connect(self._frame_timer.start)
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._count
+
+    def data(self, index, role):
+        if role != QtCore.Qt.DisplayRole or not index.isValid():
+            return None
+        row = index.row()
+        if row >= self._count:
+            return None
+        return self._lines[(self._start + row) % len(self._lines)]
+
+    def lines(self):
+        '''Returns a list of all stored messages (including the ones that
+        are not shown yet).'''
+        with self._lock:
+            pending = list(self._pending)
+        return [self.data(self.index(i), QtCore.Qt.DisplayRole)
+                for i in range(self._count)] + pending
+
+    def append(self, message):
+        '''Adds a message, can be called from any thread.'''
+        with self._lock:
+            wake = not self._pending
+            self._pending.append(message)
+        if wake:
+            self._wake.emit()
+
+    @QtCore.Slot(int)
+    def setCapacity(self, capacity):
+        '''Changes the number of messages that are kept.'''
+
+        capacity = max(capacity, 1)
+        if capacity == self._capacity:
+            return
+
+        self.beginResetModel()
+        keep = min(self._count, capacity)
+        lines = [self._lines[(self._start + i) % len(self._lines)]
+                 for i in range(self._count - keep, self._count)]
+        self._lines = lines
+        self._start = 0
+        self._count = keep
+        self._capacity = capacity
+        self.endResetModel()
+
+    @QtCore.Slot()
+    def _flush(self):
+        '''Adds the collected messages to the model.'''
+
+        with self._lock:
+            messages = self._pending
+            self._pending = []
+
+        messages = messages[-self._capacity:]
+        n = len(messages)
+        if not n:
+            return
+
+        overflow = max(self._count + n - self._capacity, 0)
+        if overflow:
+            # From now on the list is used as a ring.
+            if len(self._lines) < self._capacity:
+                missing = self._capacity - len(self._lines)
+                self._lines.extend([None] * missing)
+
+            self.beginRemoveRows(QtCore.QModelIndex(), 0, overflow - 1)
+            self._start = (self._start + overflow) % len(self._lines)
+            self._count -= overflow
+            self.endRemoveRows()
+
+        self.beginInsertRows(QtCore.QModelIndex(), self._count,
+                self._count + n - 1)
+        for m in messages:
+            if len(self._lines) < self._capacity:
+                self._lines.append(m)
+            else:
+                self._lines[(self._start + self._count) % len(self._lines)] = m
+            self._count += 1
+        self.endInsertRows()
+
+class BackgroundWriter(object):
+    '''Writes text to a file object from a separate thread, so that the
+    caller never blocks.'''
+
+    def __init__(self, f):
+        self._f = f
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def write(self, text):
+        self._queue.put(text)
+
+    def close(self):
+        '''Writes all queued text and stops the thread.'''
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            texts = [self._queue.get()]
+            # Write everything that is queued at once.
+            try:
+                while True:
+                    texts.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            done = None in texts
+            self._f.write(''.join(t for t in texts if t is not None))
+            self._f.flush()
+            if done:
+                return
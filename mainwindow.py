@@ -21,8 +21,11 @@
 import acquisition
 import datamodel
 import datetime
+import decimation
 import icons
-import multiplotwidget
+import instrumentation
+import json
+import logmodel
 import os.path
 import qtcompat
 import settings
@@ -34,7 +37,6 @@ import util
 
 QtCore = qtcompat.QtCore
 QtGui = qtcompat.QtGui
-pyqtgraph = qtcompat.pyqtgraph
 
 class EmptyMessageListView(QtGui.QListView):
     '''List view that shows a message if the model is empty.'''
@@ -44,6 +46,10 @@ class EmptyMessageListView(QtGui.QListView):
 
         self._message = message
 
+    def setMessage(self, message):
+        self._message = message
+        self.viewport().update()
+
     def paintEvent(self, event):
         m = self.model()
         if m and m.rowCount():
@@ -53,13 +59,39 @@ class EmptyMessageListView(QtGui.QListView):
         painter = QtGui.QPainter(self.viewport())
         painter.drawText(self.rect(), QtCore.Qt.AlignCenter, self._message)
 
+class Curve(object):
+    '''Helper class to keep a curve and the state needed to update it
+    together.'''
+
+    def __init__(self, item, trace, offset):
+        self.item = item
+        self.trace = trace
+        self.decimator = decimation.ScrollingDecimator(trace.select, offset)
+
+        # The color of the pen, and the number of samples the trace had
+        # when the curve was last updated.
+        self.color = None
+        self.count = -1
+
 class MainWindow(QtGui.QMainWindow):
     '''The main window of the application.'''
 
     # Update interval of the plots in milliseconds.
     UPDATEINTERVAL = 100
 
-    def __init__(self, context, drivers):
+    def __init__(self, context, drivers, sinks=(), source=None):
+        '''Initializes the main window.
+
+        :param context: The sigrok context.
+        :param drivers: List of '(driverstring, configstring)' tuples.
+        :param sinks: Objects that receive all measurements, like a
+            'recording.Recorder' or a 'server.Server' (they need the
+            methods 'add_channel()', 'write()' and 'close()').
+        :param source: Optional object that is used instead of an
+            'Acquisition' (like a 'replay.Replay'), 'drivers' is ignored
+            then.
+        '''
+
         super(self.__class__, self).__init__()
 
         # Used to coordinate the stopping of the acquisition and
@@ -68,8 +100,18 @@ class MainWindow(QtGui.QMainWindow):
 
         self.context = context
         self.drivers = drivers
-
-        self.logModel = QtGui.QStringListModel(self)
+        self.sinks = list(sinks)
+
+        # Created when the window is shown, unless another source is used.
+        self.acquisition = source
+
+        # The messages are filtered by libsigrok, and written to stderr
+        # from another thread.
+        self.logModel = logmodel.LogModel(settings.logging.lines.value(), self)
+        settings.logging.lines.changed.connect(self.logModel.setCapacity)
+        self._stderr = logmodel.BackgroundWriter(sys.stderr)
+        self.context.log_level = settings.logging.level.value()
+        settings.logging.level.changed.connect(self._set_log_level)
         self.context.set_log_callback(self._log_callback)
 
         self.delegate = datamodel.MultimeterDelegate(self, self.font())
@@ -77,81 +119,162 @@ class MainWindow(QtGui.QMainWindow):
 
         # Maps from 'unit' to the corresponding plot.
         self._plots = {}
-        # Maps from '(plot, device)' to the corresponding curve.
+        # The first plot, all others are linked to its x axis.
+        self._firstPlot = None
+        # Maps from '(plot, device)' to the corresponding 'Curve'.
         self._curves = {}
 
+        # The curves use the time the acquisition was started as their
+        # origin, the view is moved along as time passes.
+        self._t0 = time.time()
+        # The time span shown by the plots.
+        self._xspan = settings.graph.backlog.value()
+
         self._setup_ui()
 
         self._plot_update_timer = QtCore.QTimer()
         self._plot_update_timer.setInterval(MainWindow.UPDATEINTERVAL)
         self._plot_update_timer.timeout.connect(self._updatePlots)
 
+        self.model.set_backlog(settings.graph.backlog.value())
+        settings.graph.backlog.changed.connect(self.model.set_backlog)
         settings.graph.backlog.changed.connect(self.on_setting_graph_backlog_changed)
 
         QtCore.QTimer.singleShot(0, self._start_acquisition)
 
     def _start_acquisition(self):
-        self.acquisition = acquisition.Acquisition(self.context)
+        drivers = self.drivers
+        if self.acquisition is None:
+            self.acquisition = acquisition.Acquisition(self.context,
+                isolate=settings.acquisition.isolate.value())
+        else:
+            drivers = []
+
+        # A replay has no devices that could fail.
+        if hasattr(self.acquisition, 'deviceError'):
+            self.acquisition.deviceError.connect(self._device_error)
+
+        self.acquisition.channelAdded.connect(self.model.add_channel)
         self.acquisition.measured.connect(self.model.update)
         self.acquisition.stopped.connect(self._stopped)
 
+        for sink in self.sinks:
+            self.acquisition.channelAdded.connect(sink.add_channel)
+            self.acquisition.measured.connect(sink.write)
+
+        if not drivers:
+            self.start_stop_acquisition()
+            return
+
+        # The devices are opened in the background, each one starts sending
+        # data as soon as it is ready.
+        self._openErrors = []
+        self.actionStartStop.setEnabled(False)
+        self._opener = acquisition.DeviceOpener(self.acquisition, drivers,
+            settings.devices.scancache.value())
+        self._opener.opened.connect(self._device_opened)
+        self._opener.failed.connect(self._device_failed)
+        self._opener.progress.connect(self._open_progress)
+        self._opener.finished.connect(self._devices_opened)
+        self._open_progress(0, len(drivers))
+        self._opener.start()
+
+    @QtCore.Slot(str, object)
+    def _device_opened(self, driverstring, device):
         try:
-            for (ds, cs) in self.drivers:
-                self.acquisition.add_device(ds, cs)
+            self.acquisition.attach(device)
         except Exception as e:
-            QtGui.QMessageBox.critical(self, 'Error', str(e))
-            self.close()
+            self._device_failed(driverstring, str(e))
             return
 
-        self.start_stop_acquisition()
+        # Remember the device to find it faster the next time.
+        cache = dict(settings.devices.scancache.value())
+        cache[driverstring] = acquisition.device_identity(device)
+        settings.devices.scancache.setValue(cache)
 
-    def _log_callback(self, level, message):
-        if level.id > settings.logging.level.value().id:
-            return
+        if not self.actionStartStop.isEnabled():
+            # The first device is ready.
+            self.actionStartStop.setEnabled(True)
+            self.start_stop_acquisition()
+
+    @QtCore.Slot(str, str)
+    def _device_failed(self, driverstring, message):
+        self._openErrors.append('{}: {}'.format(driverstring, message))
 
+    @QtCore.Slot(str, str)
+    def _device_error(self, description, message):
+        '''Logs the error of a single device, the others keep running.'''
         t = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
-        message = '[{}] sr: {}'.format(t, message)
+        message = '[{}] {} stopped: {}'.format(t, description, message)
+        self._stderr.write(message + '\n')
+        self.logModel.append(message)
+
+    @QtCore.Slot(int, int)
+    def _open_progress(self, done, total):
+        if done < total:
+            self.listView.setMessage(
+                'opening devices ({} of {})...'.format(done + 1, total))
+        else:
+            self.listView.setMessage('waiting for data...')
 
-        sys.stderr.write(message + '\n')
+    @QtCore.Slot()
+    def _devices_opened(self):
+        if self._openErrors:
+            QtGui.QMessageBox.critical(self, 'Error',
+                'Unable to open all devices:\n\n' +
+                '\n'.join(self._openErrors))
+
+        if not self.actionStartStop.isEnabled():
+            # No device could be opened.
+            self.close()
 
-        scrollBar = self.logView.verticalScrollBar()
-        bottom = scrollBar.value() == scrollBar.maximum()
+    def _log_callback(self, level, message):
+        t = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')
+        message = '[{}] sr: {}'.format(t, message)
 
-        rows = self.logModel.rowCount()
-        maxrows = settings.logging.lines.value()
-        while rows > maxrows:
-            self.logModel.removeRows(0, 1)
-            rows -= 1
+        self._stderr.write(message + '\n')
+        self.logModel.append(message)
 
-        if self.logModel.insertRow(rows):
-            index = self.logModel.index(rows)
-            self.logModel.setData(index, message, QtCore.Qt.DisplayRole)
+    @QtCore.Slot(object)
+    def _set_log_level(self, level):
+        self.context.log_level = level
+
+    @QtCore.Slot(QtCore.QModelIndex, int, int)
+    def _log_rows_about_to_be_inserted(self, parent, first, last):
+        scrollBar = self.logView.verticalScrollBar()
+        self._logAtBottom = scrollBar.value() == scrollBar.maximum()
 
-            if bottom:
-                self.logView.scrollToBottom()
+    @QtCore.Slot(QtCore.QModelIndex, int, int)
+    def _log_rows_inserted(self, parent, first, last):
+        # Follow the new messages, unless the user scrolled up.
+        if self._logAtBottom:
+            self.logView.scrollToBottom()
 
     def _setup_ui(self):
         self.setWindowTitle('sigrok-meter')
         # Resizing the listView below will increase this again.
         self.resize(350, 10)
 
+        icons.load_resources()
         self.setWindowIcon(QtGui.QIcon(':/logo.png'))
 
+        # Only the graph page is created now, the other pages are created
+        # when they are shown the first time.
+        self.addDevicePage = None
+        self.logPage = None
+        self.logView = None
+        self.statisticsPage = None
+        self.preferencesPage = None
+
         self._setup_graphPage()
-        self._setup_addDevicePage()
-        self._setup_logPage()
-        self._setup_preferencesPage()
-
-        self._pages = [
-            self.graphPage,
-            self.addDevicePage,
-            self.logPage,
-            self.preferencesPage
-        ]
 
         self.stackedWidget = QtGui.QStackedWidget(self)
-        for page in self._pages:
-            self.stackedWidget.addWidget(page)
+        self.stackedWidget.addWidget(self.graphPage)
+
+        # The statistics are only updated while they are shown.
+        self._statistics_timer = QtCore.QTimer(self)
+        self._statistics_timer.setInterval(1000)
+        self._statistics_timer.timeout.connect(self._updateStatistics)
 
         self._setup_sidebar()
 
@@ -174,22 +297,27 @@ class MainWindow(QtGui.QMainWindow):
 
         actionGraph = self.sideBar.addAction('Instantaneous Values and Graphs')
         actionGraph.setCheckable(True)
-        actionGraph.setIcon(icons.graph)
+        actionGraph.setIcon(icons.get('graph'))
         actionGraph.triggered.connect(self.showGraphPage)
 
         #actionAdd = self.sideBar.addAction('Add Device')
         #actionAdd.setCheckable(True)
-        #actionAdd.setIcon(icons.add)
+        #actionAdd.setIcon(icons.get('add'))
         #actionAdd.triggered.connect(self.showAddDevicePage)
 
         actionLog = self.sideBar.addAction('Logs')
         actionLog.setCheckable(True)
-        actionLog.setIcon(icons.log)
+        actionLog.setIcon(icons.get('log'))
         actionLog.triggered.connect(self.showLogPage)
 
+        # There's no icon for this page, the text is shown instead.
+        actionStatistics = self.sideBar.addAction('Statistics')
+        actionStatistics.setCheckable(True)
+        actionStatistics.triggered.connect(self.showStatisticsPage)
+
         actionPreferences = self.sideBar.addAction('Preferences')
         actionPreferences.setCheckable(True)
-        actionPreferences.setIcon(icons.preferences)
+        actionPreferences.setIcon(icons.get('preferences'))
         actionPreferences.triggered.connect(self.showPreferencesPage)
 
         # Make the buttons at the top exclusive.
@@ -197,6 +325,7 @@ class MainWindow(QtGui.QMainWindow):
         self.actionGroup.addAction(actionGraph)
         #self.actionGroup.addAction(actionAdd)
         self.actionGroup.addAction(actionLog)
+        self.actionGroup.addAction(actionStatistics)
         self.actionGroup.addAction(actionPreferences)
 
         # Show graph at startup.
@@ -208,15 +337,15 @@ class MainWindow(QtGui.QMainWindow):
         self.sideBar.addWidget(fill)
 
         self.actionStartStop = self.sideBar.addAction('Start Acquisition')
-        self.actionStartStop.setIcon(icons.start)
+        self.actionStartStop.setIcon(icons.get('start'))
         self.actionStartStop.triggered.connect(self.start_stop_acquisition)
 
         actionAbout = self.sideBar.addAction('About')
-        actionAbout.setIcon(icons.about)
+        actionAbout.setIcon(icons.get('about'))
         actionAbout.triggered.connect(self.show_about)
 
         actionQuit = self.sideBar.addAction('Quit')
-        actionQuit.setIcon(icons.exit)
+        actionQuit.setIcon(icons.get('exit'))
         actionQuit.triggered.connect(self.close)
 
         s = self.style().pixelMetric(QtGui.QStyle.PM_LargeIconSize)
@@ -243,7 +372,7 @@ class MainWindow(QtGui.QMainWindow):
         ''')
 
     def _setup_graphPage(self):
-        listView = EmptyMessageListView('waiting for data...')
+        self.listView = listView = EmptyMessageListView('waiting for data...')
         listView.setFrameShape(QtGui.QFrame.NoFrame)
         listView.viewport().setBackgroundRole(QtGui.QPalette.Window)
         listView.viewport().setAutoFillBackground(True)
@@ -256,14 +385,31 @@ class MainWindow(QtGui.QMainWindow):
         listView.setUniformItemSizes(True)
         listView.setMinimumSize(self.delegate.sizeHint())
 
-        self.plotwidget = multiplotwidget.MultiPlotWidget(self)
-        self.plotwidget.plotHidden.connect(self._on_plotHidden)
+        actionResetStatistics = QtGui.QAction('Reset Statistics', listView)
+        actionResetStatistics.triggered.connect(self.model.reset_statistics)
+        listView.addAction(actionResetStatistics)
+        listView.setContextMenuPolicy(QtCore.Qt.ActionsContextMenu)
+
+        # The plots are created when the first one is needed.
+        self.plotwidget = None
 
         self.graphPage = QtGui.QSplitter(QtCore.Qt.Horizontal, self)
         self.graphPage.addWidget(listView)
-        self.graphPage.addWidget(self.plotwidget)
-        self.graphPage.setStretchFactor(0, 0)
-        self.graphPage.setStretchFactor(1, 1)
+
+    def _getPlotWidget(self):
+        '''Returns the widget holding the plots, creating it (and loading
+        PyQtGraph) the first time.'''
+
+        if self.plotwidget is None:
+            import multiplotwidget
+            self.plotwidget = multiplotwidget.MultiPlotWidget(self)
+            self.plotwidget.plotHidden.connect(self._on_plotHidden)
+
+            self.graphPage.addWidget(self.plotwidget)
+            self.graphPage.setStretchFactor(0, 0)
+            self.graphPage.setStretchFactor(1, 1)
+
+        return self.plotwidget
 
     def _setup_addDevicePage(self):
         self.addDevicePage = QtGui.QWidget(self)
@@ -279,12 +425,70 @@ class MainWindow(QtGui.QMainWindow):
         self.logView.setModel(self.logModel)
         self.logView.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
         self.logView.setSelectionMode(QtGui.QAbstractItemView.NoSelection)
+        self.logView.setUniformItemSizes(True)
+        self._logAtBottom = True
+        self.logModel.rowsAboutToBeInserted.connect(
+            self._log_rows_about_to_be_inserted)
+        self.logModel.rowsInserted.connect(self._log_rows_inserted)
         layout.addWidget(self.logView)
 
         btn = QtGui.QPushButton('Save to file...', self)
         btn.clicked.connect(self.on_save_log_clicked)
         layout.addWidget(btn)
 
+    def _setup_statisticsPage(self):
+        self.statisticsPage = QtGui.QWidget(self)
+        layout = QtGui.QVBoxLayout(self.statisticsPage)
+
+        headers = ['Stage', 'Count', 'Median', '90 %', '99 %', 'Max']
+        self.stagesTable = QtGui.QTableWidget(
+            len(instrumentation.Pipeline.STAGES), len(headers), self)
+        self.stagesTable.setHorizontalHeaderLabels(headers)
+        self.stagesTable.verticalHeader().hide()
+        self.stagesTable.setEditTriggers(
+            QtGui.QAbstractItemView.NoEditTriggers)
+        self.stagesTable.setSelectionBehavior(
+            QtGui.QAbstractItemView.SelectRows)
+        self.stagesTable.setSelectionMode(
+            QtGui.QAbstractItemView.SingleSelection)
+        self.stagesTable.itemSelectionChanged.connect(self._updateStatistics)
+        layout.addWidget(self.stagesTable)
+
+        headers = ['Counter', 'Per second', 'Total']
+        self.countersTable = QtGui.QTableWidget(
+            len(instrumentation.Pipeline.COUNTERS), len(headers), self)
+        self.countersTable.setHorizontalHeaderLabels(headers)
+        self.countersTable.verticalHeader().hide()
+        self.countersTable.setEditTriggers(
+            QtGui.QAbstractItemView.NoEditTriggers)
+        self.countersTable.setSelectionMode(
+            QtGui.QAbstractItemView.NoSelection)
+        layout.addWidget(self.countersTable)
+
+        for table, items in ((self.stagesTable, instrumentation.Pipeline.STAGES),
+                (self.countersTable, instrumentation.Pipeline.COUNTERS)):
+            for row, desc in enumerate(items.values()):
+                for col in range(table.columnCount()):
+                    table.setItem(row, col, QtGui.QTableWidgetItem())
+                table.item(row, 0).setText(desc)
+            table.resizeColumnsToContents()
+
+        # Histogram of the stage selected in the table.
+        pyqtgraph = qtcompat.load_pyqtgraph()
+        self.histogramPlot = pyqtgraph.PlotWidget(self)
+        self.histogramPlot.setLogMode(x=True)
+        self.histogramPlot.setLabel('bottom', 'Latency (s)')
+        self.histogramPlot.setMouseEnabled(x=False, y=False)
+        self.histogramCurve = self.histogramPlot.plot(stepMode=True,
+            fillLevel=0, brush=(0, 0, 255, 80))
+        layout.addWidget(self.histogramPlot)
+
+        self.stagesTable.selectRow(0)
+
+        btn = QtGui.QPushButton('Export...', self)
+        btn.clicked.connect(self.on_export_statistics_clicked)
+        layout.addWidget(btn)
+
     def _setup_preferencesPage(self):
         self.preferencesPage = QtGui.QWidget(self)
         layout = QtGui.QGridLayout(self.preferencesPage)
@@ -294,7 +498,7 @@ class MainWindow(QtGui.QMainWindow):
 
         spin = QtGui.QSpinBox(self)
         spin.setMinimum(10)
-        spin.setMaximum(3600)
+        spin.setMaximum(7 * 24 * 3600)
         spin.setSingleStep(10)
         spin.setValue(settings.graph.backlog.value())
         spin.valueChanged[int].connect(settings.graph.backlog.setValue)
@@ -335,41 +539,111 @@ class MainWindow(QtGui.QMainWindow):
         spin.valueChanged[int].connect(settings.logging.lines.setValue)
         layout.addWidget(spin, 4, 1)
 
+        layout.addWidget(QtGui.QLabel('<b>Acquisition</b>'), 5, 0)
+
+        check = QtGui.QCheckBox('Run every device in its own session '
+            '(used after a restart)', self)
+        check.setChecked(settings.acquisition.isolate.value())
+        check.toggled.connect(settings.acquisition.isolate.setValue)
+        layout.addWidget(check, 6, 0, 1, 2)
+
         layout.setRowStretch(layout.rowCount(), 100)
 
-    def showPage(self, page):
-        self.stackedWidget.setCurrentIndex(self._pages.index(page))
+    def showPage(self, name):
+        '''Shows the page 'name' ('graph', 'log', ...), creating it if it's
+        shown for the first time.'''
+
+        page = getattr(self, name + 'Page')
+        if page is None:
+            getattr(self, '_setup_{}Page'.format(name))()
+            page = getattr(self, name + 'Page')
+            self.stackedWidget.addWidget(page)
+
+        self.stackedWidget.setCurrentWidget(page)
+        self._schedulePlotUpdates()
+
+        if name == 'statistics':
+            self._updateStatistics()
+            self._statistics_timer.start()
+        else:
+            self._statistics_timer.stop()
+
+    def _plotsOnScreen(self):
+        '''Returns whether the plots can currently be seen.'''
+        return (self.isVisible() and not self.isMinimized() and
+                self.stackedWidget.currentWidget() is self.graphPage)
+
+    def _schedulePlotUpdates(self):
+        '''Starts or stops the periodic plot updates, depending on whether
+        the acquisition is running and the plots are on the screen. When the
+        updates are resumed, the plots are brought up to date at once.'''
+
+        running = self.acquisition and self.acquisition.is_running()
+        update = bool(running and self._plotsOnScreen())
+        instrumentation.pipeline.set_display_paused(not update)
+
+        if update:
+            if not self._plot_update_timer.isActive():
+                self._updatePlots()
+                self._plot_update_timer.start()
+        else:
+            self._plot_update_timer.stop()
+
+    def changeEvent(self, event):
+        if event.type() == QtCore.QEvent.WindowStateChange:
+            self._schedulePlotUpdates()
+        super(self.__class__, self).changeEvent(event)
+
+    def showEvent(self, event):
+        super(self.__class__, self).showEvent(event)
+        self._schedulePlotUpdates()
+
+    def hideEvent(self, event):
+        super(self.__class__, self).hideEvent(event)
+        self._schedulePlotUpdates()
 
     @QtCore.Slot(bool)
     def showGraphPage(self):
-        self.showPage(self.graphPage)
+        self.showPage('graph')
 
     @QtCore.Slot(bool)
     def showAddDevicePage(self):
-        self.showPage(self.addDevicePage)
+        self.showPage('addDevice')
 
     @QtCore.Slot(bool)
     def showLogPage(self):
-        self.showPage(self.logPage)
+        self.showPage('log')
+
+    @QtCore.Slot(bool)
+    def showStatisticsPage(self):
+        self.showPage('statistics')
 
     @QtCore.Slot(bool)
     def showPreferencesPage(self):
-        self.showPage(self.preferencesPage)
+        self.showPage('preferences')
 
     @QtCore.Slot(int)
     def on_setting_graph_backlog_changed(self, bl):
-        for unit in self._plots:
-            plot = self._plots[unit]
+        self._xspan = bl
+        self._scroll(time.time(), bl)
 
-            # Remove the limits first, otherwise the range update would
-            # be ignored.
-            plot.view.setLimits(xMin=None, xMax=None)
+    def _scroll(self, now, span=None):
+        '''Moves the view of the plots so that 'now' is on the right edge.
+        If no 'span' is given, the zoom level selected by the user is kept.'''
 
-            # Now change the range, and then use the calculated limits
-            # (also see the comment in '_getPlot()').
-            plot.view.setXRange(-bl, 0, update=True)
-            r = plot.view.viewRange()
-            plot.view.setLimits(xMin=r[0][0], xMax=r[0][1])
+        if not self._firstPlot:
+            return
+
+        if span is None:
+            r = self._firstPlot.view.viewRange()[0]
+            span = min(r[1] - r[0], self._xspan)
+
+        # The other plots follow because their views are linked.
+        origin = now - self._t0
+        self._firstPlot.view.setXRange(origin - span, origin, padding=0,
+                update=True)
+        for plot in self._plots.values():
+            plot.xaxis.setOrigin(origin)
 
     def _getPlot(self, unit):
         '''Looks up or creates a new plot for 'unit'.'''
@@ -378,20 +652,23 @@ class MainWindow(QtGui.QMainWindow):
             return self._plots[unit]
 
         # Create a new plot for the unit.
-        plot = self.plotwidget.addPlot()
+        pyqtgraph = qtcompat.load_pyqtgraph()
+        plot = self._getPlotWidget().addPlot()
         plot.yaxis.setLabel(util.quantity_from_unit(unit), units=util.format_unit(unit))
-        plot.view.setXRange(-settings.graph.backlog.value(), 0, update=False)
+        origin = time.time() - self._t0
+        plot.view.setXRange(origin - self._xspan, origin, padding=0,
+                update=False)
         plot.view.setYRange(-1, 1)
         plot.view.enableAutoRange(axis=pyqtgraph.ViewBox.YAxis)
-        # Lock to the range calculated by the view using additional padding,
-        # looks nicer this way.
-        r = plot.view.viewRange()
-        plot.view.setLimits(xMin=r[0][0], xMax=r[0][1])
+        plot.xaxis.setOrigin(origin)
+
+        if not self._firstPlot:
+            self._firstPlot = plot
 
         self._plots[unit] = plot
         return plot
 
-    def _getCurve(self, plot, deviceID):
+    def _getCurve(self, plot, deviceID, trace):
         '''Looks up or creates a new curve for '(plot, deviceID)'.'''
 
         key = (plot, deviceID)
@@ -399,70 +676,86 @@ class MainWindow(QtGui.QMainWindow):
             return self._curves[key]
 
         # Create a new curve.
-        curve = pyqtgraph.PlotDataItem(
+        pyqtgraph = qtcompat.load_pyqtgraph()
+        item = pyqtgraph.PlotDataItem(
             antialias=True,
             symbolPen=pyqtgraph.mkPen(QtGui.QColor(QtCore.Qt.black)),
             symbolBrush=pyqtgraph.mkBrush(QtGui.QColor(QtCore.Qt.black)),
             symbolSize=1
         )
-        plot.view.addItem(curve)
+        plot.view.addItem(item)
 
+        curve = Curve(item, trace, self._t0)
         self._curves[key] = curve
         return curve
 
     def _updatePlots(self):
         '''Updates all plots.'''
 
+        now = time.time()
+        self._scroll(now)
+        self._updateCurves()
+
+        end = time.time()
+        instrumentation.pipeline.record('render', end - now, end)
+        instrumentation.pipeline.rendered(end)
+
+    def _updateCurves(self):
+        '''Updates the curves of all plots with the new samples.'''
+
         # Loop over all devices and channels.
-        for row in range(self.model.rowCount()):
-            idx = self.model.index(row, 0)
-            deviceID = self.model.data(idx,
-                            datamodel.MeasurementDataModel.idRole)
-            deviceID = tuple(deviceID) # PySide returns a list.
-            traces = self.model.data(idx,
-                            datamodel.MeasurementDataModel.tracesRole)
-
-            for unit, trace in traces.items():
-                now = time.time()
-
-                # Remove old samples.
-                l = now - settings.graph.backlog.value()
-                while trace.samples and trace.samples[0][0] < l:
-                    trace.samples.pop(0)
+        for row in self.model.rows():
+            deviceID = row.uid
 
+            for unit, trace in row.traces.items():
                 plot = self._getPlot(unit)
                 if not plot.visible:
                     if trace.new:
                         self.plotwidget.showPlot(plot)
 
                 if plot.visible:
-                    xdata = [s[0] - now for s in trace.samples]
-                    ydata = [s[1]       for s in trace.samples]
-
-                    color = self.model.data(idx,
-                                datamodel.MeasurementDataModel.colorRole)
-
-                    curve = self._getCurve(plot, deviceID)
-                    curve.setPen(pyqtgraph.mkPen(color=color))
-                    curve.setData(xdata, ydata)
-
-    @QtCore.Slot(multiplotwidget.Plot)
+                    curve = self._getCurve(plot, deviceID, trace)
+
+                    # Only create a new pen if the color changed.
+                    if curve.color != row.color:
+                        # Already loaded by '_getPlot()'.
+                        pyqtgraph = qtcompat.load_pyqtgraph()
+                        curve.color = QtGui.QColor(row.color)
+                        curve.item.setPen(pyqtgraph.mkPen(color=curve.color))
+
+                    # Only draw as many points as there are pixels, and only
+                    # do work for the new samples.
+                    x0, x1 = plot.view.viewRange()[0]
+                    x0 += self._t0
+                    x1 += self._t0
+                    width = plot.view.boundingRect().width()
+                    if (curve.count == trace.count and
+                            curve.decimator.valid(x0, x1, width)):
+                        continue
+
+                    curve.count = trace.count
+                    xdata, ydata = curve.decimator.update(x0, x1, width)
+                    curve.item.setData(xdata, ydata)
+
+    @QtCore.Slot(object)
     def _on_plotHidden(self, plot):
         plotunit = [u for u, p in self._plots.items() if p == plot][0]
 
         # Mark all traces of all devices/channels with the same unit as the
         # plot as "old" ('trace.new = False'). As soon as a new sample arrives
         # on one trace, the plot will be shown again.
-        for row in range(self.model.rowCount()):
-            idx = self.model.index(row, 0)
-            traces = self.model.data(idx, datamodel.MeasurementDataModel.tracesRole)
-
-            for traceunit, trace in traces.items():
+        for row in self.model.rows():
+            for traceunit, trace in row.traces.items():
                 if traceunit == plotunit:
                     trace.new = False
 
     @QtCore.Slot()
     def _stopped(self):
+        self._schedulePlotUpdates()
+        # The source may also stop by itself (e.g. at the end of a replay).
+        self.actionStartStop.setText('Start Acquisition')
+        self.actionStartStop.setIcon(icons.get('start'))
+
         if self._closing:
             # The acquisition was stopped by the 'closeEvent()', close the
             # window again now that the acquisition has stopped.
@@ -477,6 +770,9 @@ class MainWindow(QtGui.QMainWindow):
         else:
             settings.mainwindow.size.setValue(self.size())
             settings.mainwindow.pos.setValue(self.pos())
+            for sink in self.sinks:
+                sink.close()
+            self._stderr.close()
             event.accept()
 
     @QtCore.Slot()
@@ -485,7 +781,7 @@ class MainWindow(QtGui.QMainWindow):
             self.acquisition.stop()
             self._plot_update_timer.stop()
             self.actionStartStop.setText('Start Acquisition')
-            self.actionStartStop.setIcon(icons.start)
+            self.actionStartStop.setIcon(icons.get('start'))
         else:
             # Before starting (again), remove all old samples and old curves.
             self.model.clear_samples()
@@ -493,13 +789,61 @@ class MainWindow(QtGui.QMainWindow):
             for key in self._curves:
                 plot, _ = key
                 curve = self._curves[key]
-                plot.view.removeItem(curve)
+                plot.view.removeItem(curve.item)
             self._curves = {}
+            self._t0 = time.time()
 
             self.acquisition.start()
-            self._plot_update_timer.start()
+            self._schedulePlotUpdates()
             self.actionStartStop.setText('Stop Acquisition')
-            self.actionStartStop.setIcon(icons.stop)
+            self.actionStartStop.setIcon(icons.get('stop'))
+
+    @QtCore.Slot()
+    def _updateStatistics(self):
+        '''Shows the current statistics on the statistics page.'''
+
+        stats = instrumentation.pipeline.snapshot()
+
+        def fmt(v):
+            if v is None:
+                return ''
+            value, prefix = util.format_value(v, sr.Unit.SECOND)
+            return '{} {}s'.format(value, prefix)
+
+        for row, key in enumerate(instrumentation.Pipeline.STAGES):
+            stage = stats['stages'][key]
+            texts = [str(stage['count'])] + [fmt(stage[p])
+                    for p in ('p50', 'p90', 'p99', 'p100')]
+            for col, text in enumerate(texts):
+                self.stagesTable.item(row, col + 1).setText(text)
+
+        for row, key in enumerate(instrumentation.Pipeline.COUNTERS):
+            counter = stats['counters'][key]
+            self.countersTable.item(row, 1).setText(str(counter['rate']))
+            self.countersTable.item(row, 2).setText(str(counter['total']))
+
+        rows = self.stagesTable.selectionModel().selectedRows()
+        if rows:
+            key = list(instrumentation.Pipeline.STAGES)[rows[0].row()]
+            stage = stats['stages'][key]
+            self.histogramCurve.setData(stage['edges'], stage['histogram'])
+
+    @QtCore.Slot()
+    def on_export_statistics_clicked(self):
+        filename = QtGui.QFileDialog.getSaveFileName(self,
+                    'Export Statistics', 'statistics.json')
+
+        if not filename:
+            # User pressed 'cancel'.
+            return
+
+        try:
+            with open(filename, 'w') as f:
+                json.dump(instrumentation.pipeline.snapshot(), f, indent=2,
+                    sort_keys=True)
+        except Exception as e:
+            QtGui.QMessageBox.critical(self, 'Error exporting statistics',
+               'Unable to export the statistics:\n{}'.format(e))
 
     @QtCore.Slot()
     def on_save_log_clicked(self):
@@ -512,7 +856,7 @@ class MainWindow(QtGui.QMainWindow):
 
         try:
             with open(filename, 'w') as f:
-                for line in self.logModel.stringList():
+                for line in self.logModel.lines():
                     f.write(line)
                     f.write('\n')
         except Exception as e:
@@ -21,7 +21,7 @@ import qtcompat
 
 QtCore = qtcompat.QtCore
 QtGui = qtcompat.QtGui
-pyqtgraph = qtcompat.pyqtgraph
+pyqtgraph = qtcompat.load_pyqtgraph()
 
 # Black foreground on white background.
 pyqtgraph.setConfigOption('background', 'w')
@@ -36,6 +36,35 @@ class Plot(object):
         self.yaxis = yaxis
         self.visible = False
 
+class RelativeAxisItem(pyqtgraph.AxisItem):
+    '''Axis that labels the values relative to a moving origin.
+
+    The ticks are placed at round distances from the origin, so they stay
+    in place (and the data moves) when the origin and the view range are
+    moved by the same amount.'''
+
+    def __init__(self, *args, **kwargs):
+        pyqtgraph.AxisItem.__init__(self, *args, **kwargs)
+        self._origin = 0.0
+
+    def setOrigin(self, origin):
+        if origin != self._origin:
+            self._origin = origin
+            self.picture = None
+            self.update()
+
+    def tickValues(self, minVal, maxVal, size):
+        o = self._origin
+        levels = pyqtgraph.AxisItem.tickValues(self, minVal - o, maxVal - o,
+                size)
+        return [(spacing, [v + o for v in values])
+                for (spacing, values) in levels]
+
+    def tickStrings(self, values, scale, spacing):
+        o = self._origin
+        return pyqtgraph.AxisItem.tickStrings(self,
+                [v - o for v in values], scale, spacing)
+
 class MultiPlotItem(pyqtgraph.GraphicsWidget):
 
     # Emitted when a plot is shown.
@@ -80,7 +109,7 @@ class MultiPlotItem(pyqtgraph.GraphicsWidget):
         yaxis.linkToView(view)
         yaxis.setGrid(255)
 
-        xaxis = pyqtgraph.AxisItem(parent=self, orientation='bottom')
+        xaxis = RelativeAxisItem(parent=self, orientation='bottom')
         xaxis.linkToView(view)
         xaxis.setGrid(255)
 
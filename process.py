@@ -0,0 +1,546 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+'''Acquisition in a separate process.
+
+The child process (see 'child_main()') runs a normal 'Acquisition'
+and writes the measurements into a ring buffer in a memory mapped file,
+using the frames of the 'server' module. The parent maps the same file and
+reads the new frames periodically, so the data never passes through a pipe
+and rendering in the parent can't hold up the acquisition.
+
+The processes also talk over the pipes of the child: the parent sends
+commands ('start', 'stop') as lines, the child sends events as lines of
+JSON. The channels are announced as events too, because the ring loses
+frames if the parent falls behind, and the measurements of an unknown
+channel are useless. The child quits when its input is closed.
+'''
+
+import acquisition
+import json
+import mmap
+import os
+import qtcompat
+import server
+import sigrok.core as sr
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+QtCore = qtcompat.QtCore
+
+# Run by the child's interpreter. The first argument is the directory of
+# the modules, Qt must be loaded before they can be imported.
+_LAUNCHER = '''
+import sys
+sys.path.insert(0, sys.argv.pop(1))
+import qtcompat
+qtcompat.load_modules('--pyside' in sys.argv)
+app = qtcompat.QtCore.QCoreApplication([])
+import process
+sys.exit(process.child_main(app))
+'''
+
+class SharedRing(object):
+    '''Ring buffer of frames in a memory mapped file, written by one process
+    and read by another.
+
+    The file starts with two positions (uint64 each, counting all bytes ever
+    written): the end of the frames that are completely written, and the
+    end of the frame being written, which is updated before the writer
+    touches the buffer. The reader checks the latter after copying, to
+    detect that the writer overwrote what was copied. A frame never wraps
+    around the end of the buffer, the rest of the buffer is skipped instead
+    (marked by a zero length if there is room for it). The writer never
+    waits: if the reader falls behind by more than the capacity, the frames
+    in between are lost.
+    '''
+
+    _HEAD = struct.Struct('<QQ')
+    _LENGTH = struct.Struct('>I')
+
+    def __init__(self, path, capacity):
+        '''Maps the ring in the file 'path', which must be 'capacity' plus
+        16 bytes long.'''
+
+        self.path = path
+        self.capacity = capacity
+
+        self._f = open(path, 'r+b')
+        self._map = mmap.mmap(self._f.fileno(),
+                SharedRing._HEAD.size + capacity)
+
+        # Position of the reader.
+        self._tail = self._head()
+
+        # Number of times the reader fell behind and frames were lost.
+        self.overruns = 0
+
+    @staticmethod
+    def create(capacity):
+        '''Creates a new ring in a temporary file, in memory if possible.'''
+        shm = '/dev/shm'
+        fd, path = tempfile.mkstemp(prefix='sigrok-meter-', suffix='.ring',
+                dir=shm if os.path.isdir(shm) else None)
+        os.ftruncate(fd, SharedRing._HEAD.size + capacity)
+        os.close(fd)
+        return SharedRing(path, capacity)
+
+    def unlink(self):
+        '''Removes the file, the mapping stays valid.'''
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def close(self):
+        self._map.close()
+        self._f.close()
+
+    def _head(self):
+        '''Returns the end of the completely written frames.'''
+        return SharedRing._HEAD.unpack_from(self._map, 0)[0]
+
+    def _reserved(self):
+        '''Returns the end of the frame being written.'''
+        return SharedRing._HEAD.unpack_from(self._map, 0)[1]
+
+    def write(self, frame):
+        '''Appends a frame. Returns 'False' if it is larger than the whole
+        buffer and was dropped.'''
+
+        n = len(frame)
+        if n > self.capacity:
+            return False
+
+        done = self._head()
+        head = done
+        pos = head % self.capacity
+        room = self.capacity - pos
+        if room < n:
+            # Skip the rest of the buffer.
+            head += room
+
+        # Announce the bytes that are going to change before changing them.
+        SharedRing._HEAD.pack_into(self._map, 0, done, head + n)
+
+        if head != done and room >= SharedRing._LENGTH.size:
+            SharedRing._LENGTH.pack_into(self._map,
+                    SharedRing._HEAD.size + pos, 0)
+
+        start = SharedRing._HEAD.size + head % self.capacity
+        self._map[start:start + n] = frame
+        SharedRing._HEAD.pack_into(self._map, 0, head + n, head + n)
+        return True
+
+    def read(self):
+        '''Returns the frames written since the last call, as a list of
+        '(type, payload)' tuples like 'server.recv_frame()'.
+
+        The new part of the buffer is copied at once. The payloads are
+        'bytes' (not views into the copy, which Python 2 can't decode).'''
+
+        head = self._head()
+        tail = self._tail
+        n = head - tail
+        if not n:
+            return []
+
+        if n <= self.capacity:
+            h = SharedRing._HEAD.size
+            start = tail % self.capacity
+            if start + n <= self.capacity:
+                data = self._map[h + start:h + start + n]
+            else:
+                data = (self._map[h + start:h + self.capacity] +
+                        self._map[h:h + start + n - self.capacity])
+
+        # Everything before 'reserved - capacity' may have been overwritten
+        # while it was copied, including by a frame still being written.
+        if n > self.capacity or self._reserved() - tail > self.capacity:
+            self.overruns += 1
+            self._tail = head
+            return []
+        self._tail = head
+
+        frames = []
+        i = 0
+        while i < n:
+            room = self.capacity - (tail + i) % self.capacity
+            if room < SharedRing._LENGTH.size:
+                i += room
+                continue
+
+            length, = SharedRing._LENGTH.unpack_from(data, i)
+            if not length:
+                i += room
+                continue
+
+            start = i + SharedRing._LENGTH.size
+            if start + length > n:
+                # Can't happen unless the buffer is corrupted.
+                self.overruns += 1
+                break
+            frames.append((data[start:start + 1],
+                data[start + 1:start + length]))
+            i = start + length
+
+        return frames
+
+class ProcessAcquisition(QtCore.QObject):
+    '''Runs an 'Acquisition' in a child process, and offers the same signals
+    and slots as the 'Acquisition' itself.'''
+
+    '''See 'Acquisition.channelAdded'.'''
+    channelAdded = QtCore.Signal(int, object)
+
+    '''See 'Acquisition.measured'.'''
+    measured = QtCore.Signal(object)
+
+    '''See 'Acquisition.stopped'.'''
+    stopped = QtCore.Signal()
+
+    '''Signal emitted when a device couldn't be opened or failed, with the
+    description of the device and the error message.'''
+    deviceError = QtCore.Signal(str, str)
+
+    # Used to pass the events from the thread reading the child's output.
+    _event = QtCore.Signal(object)
+
+    # Interval in milliseconds in which the ring is read.
+    POLLINTERVAL = 20
+
+    # Size of the ring in bytes.
+    RINGSIZE = 16 * 1024 * 1024
+
+    # Time in seconds the child gets to stop its acquisition when closing,
+    # before it is terminated (and then killed).
+    CLOSETIMEOUT = 3.0
+
+    def __init__(self, drivers, isolate=False, loglevel=None,
+            force_pyside=False):
+        '''Starts the child process, which opens the devices.
+
+        :param drivers: List of '(driverstring, configstring)' tuples.
+        :param isolate: See 'Acquisition'.
+        :param loglevel: The 'sr.LogLevel' of the child's sigrok context.
+        :param force_pyside: Use PySide in the child.
+        '''
+
+        super(self.__class__, self).__init__()
+
+        self._ring = SharedRing.create(ProcessAcquisition.RINGSIZE)
+
+        path = os.path.dirname(os.path.abspath(__file__))
+        args = [sys.executable, '-c', _LAUNCHER, path,
+                '--ring', self._ring.path, '--size', str(self._ring.capacity)]
+        for (ds, cs) in drivers:
+            args += ['--driver', ds, '--config', cs]
+        if isolate:
+            args.append('--isolate')
+        if loglevel is not None:
+            args += ['--loglevel', str(loglevel.id)]
+        if force_pyside:
+            args.append('--pyside')
+
+        try:
+            self._process = subprocess.Popen(args, stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE)
+        except Exception:
+            self._ring.unlink()
+            raise
+
+        self._running = False
+        self._exited = False
+
+        # Maps from '(unit id, mq flags)' to the unit and the list of flags.
+        self._units = {}
+
+        # The handles of the announced channels, and the measurements of
+        # channels whose announcement wasn't read yet. (The child sends the
+        # announcement first, but the events are read by another thread.)
+        self._handles = set()
+        self._waiting = {}
+
+        self._poll_timer = QtCore.QTimer(self)
+        self._poll_timer.setInterval(ProcessAcquisition.POLLINTERVAL)
+        self._poll_timer.timeout.connect(self.poll)
+
+        self._event.connect(self._handle_event)
+        self._reader = threading.Thread(target=self._read_events)
+        self._reader.daemon = True
+        self._reader.start()
+
+    @property
+    def overruns(self):
+        '''Number of times measurements were lost because they weren't read
+        in time.'''
+        return self._ring.overruns
+
+    def is_running(self):
+        return self._running
+
+    @QtCore.Slot()
+    def start(self):
+        if self._exited:
+            raise RuntimeError('The acquisition process is not running.')
+        self._send('start')
+        self._running = True
+        self._poll_timer.start()
+
+    @QtCore.Slot()
+    def stop(self):
+        if self._running:
+            self._send('stop')
+
+    @QtCore.Slot()
+    def close(self):
+        '''Ends the child process and waits for it.
+
+        A child whose devices don't stop (which is a reason to use a
+        separate process in the first place) is terminated.'''
+
+        if self._process.stdin.closed:
+            return
+        self._process.stdin.close()
+
+        timeout = ProcessAcquisition.CLOSETIMEOUT
+        if not self._wait(timeout):
+            self._process.terminate()
+            if not self._wait(timeout):
+                self._process.kill()
+                self._process.wait()
+
+        self._poll_timer.stop()
+        self._ring.unlink()
+        self._ring.close()
+
+    def _wait(self, timeout):
+        '''Waits up to 'timeout' seconds for the child to exit, returns
+        whether it did. ('Popen.wait()' has no timeout in Python 2.)'''
+        deadline = time.time() + timeout
+        while self._process.poll() is None:
+            if time.time() >= deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _send(self, command):
+        try:
+            self._process.stdin.write((command + '\n').encode('ascii'))
+            self._process.stdin.flush()
+        except (IOError, OSError, ValueError):
+            # The child already exited, which is reported as an event.
+            pass
+
+    def _read_events(self):
+        for line in iter(self._process.stdout.readline, b''):
+            try:
+                event = json.loads(line.decode('utf-8'))
+            except ValueError:
+                continue
+            self._event.emit(event)
+        self._event.emit({'event': 'exit'})
+
+    @QtCore.Slot(object)
+    def _handle_event(self, event):
+        name = event['event']
+
+        if name == 'ready':
+            # The child has mapped the file.
+            self._ring.unlink()
+        elif name == 'channel':
+            handle = event['handle']
+            self._handles.add(handle)
+            self.channelAdded.emit(handle, server.channel_info(event['info']))
+            if handle in self._waiting:
+                self.measured.emit(self._waiting.pop(handle))
+        elif name == 'deviceError':
+            self.deviceError.emit(event['device'], event['message'])
+        elif name == 'stopped':
+            self._stopped()
+        elif name == 'exit':
+            self._exited = True
+            if self._running:
+                self.deviceError.emit('Acquisition process',
+                        'The process exited unexpectedly.')
+                self._stopped()
+
+    def _stopped(self):
+        self.poll()
+        self._poll_timer.stop()
+        self._running = False
+        self.stopped.emit()
+
+    def _unit(self, unit, flags):
+        key = (unit, flags)
+        if not key in self._units:
+            self._units[key] = (sr.Unit.get(unit),
+                    [sr.QuantityFlag.get(1 << i) for i in range(64)
+                     if flags & (1 << i)])
+        return self._units[key]
+
+    @QtCore.Slot()
+    def poll(self):
+        '''Reads the new frames from the ring and emits the measurements.'''
+
+        if self._process.stdin.closed:
+            return
+
+        # The frames don't carry the time the packets arrived in the child,
+        # the delivery is measured from the time they are read.
+        now = time.time()
+        batch = []
+        for kind, payload in self._ring.read():
+            try:
+                decoded = server.decode(kind, payload)
+            except Exception:
+                # A damaged frame, treated like a lost one.
+                self._ring.overruns += 1
+                continue
+
+            if kind == b'M':
+                handle, unit, flags, ts, vs = decoded
+                unit, mqflags = self._unit(unit, flags)
+                m = acquisition.Measurement(handle, ts, vs, unit, mqflags,
+                        now)
+                if handle in self._handles:
+                    batch.append(m)
+                else:
+                    self._waiting.setdefault(handle, []).append(m)
+
+        if batch:
+            self.measured.emit(batch)
+
+class _RingSink(object):
+    '''Writes the measurements of the child's 'Acquisition' into the ring.'''
+
+    def __init__(self, ring):
+        self._ring = ring
+        # The isolated devices send their data from different threads.
+        self._lock = threading.Lock()
+
+    def write(self, batch):
+        with self._lock:
+            for m in batch:
+                if not self._ring.write(server.encode_measurement(m)):
+                    sys.stderr.write('Warning: A measurement with {} samples '
+                        'is too large for the ring.\n'.format(len(m.values)))
+
+class _Child(QtCore.QObject):
+    '''The main object of the child process.'''
+
+    # Used to pass the commands from the thread reading the input.
+    _command = QtCore.Signal(str)
+
+    def __init__(self, args):
+        super(self.__class__, self).__init__()
+
+        self._events_lock = threading.Lock()
+        self._quitting = False
+
+        self._ring = SharedRing(args.ring, args.size)
+        self._sink = _RingSink(self._ring)
+
+        context = sr.Context_create()
+        if args.loglevel is not None:
+            context.log_level = sr.LogLevel.get(args.loglevel)
+
+        self._acquisition = acquisition.Acquisition(context,
+                isolate=args.isolate)
+        self._acquisition.channelAdded.connect(self._channel_added)
+        self._acquisition.measured.connect(self._sink.write)
+        self._acquisition.stopped.connect(self._stopped)
+        self._acquisition.deviceError.connect(self._device_error)
+
+        for (ds, cs) in zip(args.driver, args.config):
+            try:
+                self._acquisition.add_device(ds, cs)
+            except Exception as e:
+                self._device_error(ds, str(e))
+
+        self._send_event({'event': 'ready'})
+
+        self._command.connect(self._handle_command)
+        self._reader = threading.Thread(target=self._read_commands)
+        self._reader.daemon = True
+        self._reader.start()
+
+    def _send_event(self, event):
+        with self._events_lock:
+            sys.stdout.write(json.dumps(event) + '\n')
+            sys.stdout.flush()
+
+    def _read_commands(self):
+        for line in iter(sys.stdin.readline, ''):
+            self._command.emit(line.strip())
+        self._command.emit('quit')
+
+    @QtCore.Slot(str)
+    def _handle_command(self, command):
+        acq = self._acquisition
+        if command == 'start' and not acq.is_running():
+            try:
+                acq.start()
+            except Exception as e:
+                self._device_error('Acquisition', str(e))
+                self._send_event({'event': 'stopped'})
+        elif command == 'stop':
+            acq.stop()
+        elif command == 'quit':
+            self._quitting = True
+            if acq.is_running():
+                acq.stop()
+            else:
+                QtCore.QCoreApplication.instance().quit()
+
+    @QtCore.Slot(int, object)
+    def _channel_added(self, handle, info):
+        self._send_event({'event': 'channel', 'handle': handle,
+            'info': server.channel_fields(info)})
+
+    def _device_error(self, device, message):
+        self._send_event({'event': 'deviceError', 'device': device,
+            'message': message})
+
+    @QtCore.Slot()
+    def _stopped(self):
+        self._send_event({'event': 'stopped'})
+        if self._quitting:
+            QtCore.QCoreApplication.instance().quit()
+
+def child_main(app):
+    '''Runs the child process, returns the exit code.'''
+
+    import argparse
+    parser = argparse.ArgumentParser(
+        description='Acquisition process of sigrok-meter, not meant to be '
+                    'started directly.')
+    parser.add_argument('--ring', required=True)
+    parser.add_argument('--size', type=int, required=True)
+    parser.add_argument('--driver', action='append', default=[])
+    parser.add_argument('--config', action='append', default=[])
+    parser.add_argument('--isolate', action='store_true', default=False)
+    parser.add_argument('--loglevel', type=int, default=None)
+    parser.add_argument('--pyside', action='store_true', default=False)
+    args = parser.parse_args()
+
+    child = _Child(args)
+    return app.exec_()
@@ -19,7 +19,11 @@
 
 import sys
 
+pyqtgraph = None
+
 def load_modules(force_pyside):
+    '''Loads the Qt modules.'''
+
     if force_pyside:
         import PySide.QtCore as _QtCore
         import PySide.QtGui as _QtGui
@@ -52,8 +56,15 @@ def load_modules(force_pyside):
     QtCore = _QtCore
     QtGui = _QtGui
 
-    import pyqtgraph as _pyqtgraph
-    import pyqtgraph.dockarea as _pyqtgraph_dockarea
+def load_pyqtgraph():
+    '''Loads PyQtGraph (if it's not already loaded) and returns it.
+
+    Loading it takes a while, so it's only done when the first plot is
+    needed. 'load_modules()' must have been called before.
+    '''
+
     global pyqtgraph
-    pyqtgraph = _pyqtgraph
-    pyqtgraph.dockarea = _pyqtgraph_dockarea
+    if pyqtgraph is None:
+        import pyqtgraph as _pyqtgraph
+        pyqtgraph = _pyqtgraph
+    return pyqtgraph
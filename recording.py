@@ -0,0 +1,242 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+'''Storage of measurements on disk.
+
+A recording is a directory that contains three files for every stream of
+samples (one stream per channel, unit and set of mq flags):
+
+  stream-N.json   Header with the description of the channel.
+  stream-N.time   The timestamps of the samples.
+  stream-N.value  The values of the samples.
+
+The columns are plain arrays of little endian 64 bit floats, so they can be
+appended to cheaply and memory-mapped when reading.
+'''
+
+import acquisition
+import glob
+import io
+import json
+import numpy
+import os
+import qtcompat
+import sigrok.core as sr
+
+QtCore = qtcompat.QtCore
+
+FORMAT = 'sigrok-meter-recording'
+VERSION = 1
+DTYPE = '<f8'
+
+def _stream_path(path, n, ext):
+    return os.path.join(path, 'stream-{}.{}'.format(n, ext))
+
+class _StreamWriter(object):
+    '''Buffers and writes the samples of a single stream.'''
+
+    def __init__(self, path, n, header):
+        with io.open(_stream_path(path, n, 'json'), 'w',
+                encoding='utf-8') as f:
+            f.write(json.dumps(header, ensure_ascii=False, indent=2))
+
+        self._time = open(_stream_path(path, n, 'time'), 'ab')
+        self._value = open(_stream_path(path, n, 'value'), 'ab')
+        self._blocks = []
+        self.buffered = 0
+
+    def add(self, timestamps, values):
+        self._blocks.append((timestamps, values))
+        self.buffered += len(timestamps)
+
+    def flush(self):
+        if not self._blocks:
+            return
+
+        t = numpy.concatenate([b[0] for b in self._blocks]).astype(DTYPE)
+        v = numpy.concatenate([b[1] for b in self._blocks]).astype(DTYPE)
+        self._time.write(t.tobytes())
+        self._value.write(v.tobytes())
+        self._time.flush()
+        self._value.flush()
+
+        self._blocks = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self._time.close()
+        self._value.close()
+
+class Recorder(QtCore.QObject):
+    '''Writes the measurements of an 'Acquisition' into a recording.'''
+
+    # Number of samples of a stream that are buffered before they are
+    # written.
+    BLOCKSAMPLES = 8192
+
+    # Maximum time in milliseconds samples are buffered.
+    FLUSHINTERVAL = 1000
+
+    def __init__(self, path):
+        '''Creates a new recording in the directory 'path'.'''
+
+        super(self.__class__, self).__init__()
+
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        if glob.glob(os.path.join(path, 'stream-*')):
+            raise RuntimeError(
+                '"{}" already contains a recording.'.format(path))
+
+        self._path = path
+
+        # Maps from the handle of a channel to its 'ChannelInfo'.
+        self._channels = {}
+
+        # Maps from '(handle, unit id, mq flag ids)' to the stream writer.
+        self._streams = {}
+
+        # Measurements still queued when the recorder is closed are ignored,
+        # they would overwrite the streams.
+        self._closed = False
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(Recorder.FLUSHINTERVAL)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    @QtCore.Slot(int, object)
+    def add_channel(self, handle, info):
+        if not self._closed:
+            self._channels[handle] = info
+
+    def _getStream(self, m):
+        '''Returns the writer of the stream of a measurement, or 'None' if
+        its channel is unknown.'''
+
+        flags = tuple(sorted(f.id for f in m.mqflags))
+        key = (m.handle, m.unit.id, flags)
+        if key in self._streams:
+            return self._streams[key]
+
+        info = self._channels.get(m.handle)
+        if info is None:
+            return None
+        header = {
+            'format': FORMAT,
+            'version': VERSION,
+            'dtype': DTYPE,
+            'vendor': info.vendor,
+            'model': info.model,
+            'serial_number': info.serial_number,
+            'connection_id': info.connection_id,
+            'index': info.index,
+            'name': info.name,
+            'device': info.device,
+            'unit': m.unit.id,
+            'mqflags': list(flags)
+        }
+
+        stream = _StreamWriter(self._path, len(self._streams), header)
+        self._streams[key] = stream
+        return stream
+
+    @QtCore.Slot(object)
+    def write(self, batch):
+        '''Adds a batch of measurements to the recording.'''
+
+        if self._closed:
+            return
+
+        for m in batch:
+            stream = self._getStream(m)
+            if stream is None:
+                continue
+            stream.add(m.timestamps, m.values)
+            if stream.buffered >= Recorder.BLOCKSAMPLES:
+                stream.flush()
+
+    @QtCore.Slot()
+    def flush(self):
+        '''Writes all buffered samples to disk.'''
+        for stream in self._streams.values():
+            stream.flush()
+
+    @QtCore.Slot()
+    def close(self):
+        self._closed = True
+        self._timer.stop()
+        for stream in self._streams.values():
+            stream.close()
+        self._streams = {}
+
+class Stream(object):
+    '''A stream of samples read from a recording.
+
+    'timestamps' and 'values' are read-only memory-mapped arrays.
+    '''
+
+    def __init__(self, path, n):
+        with io.open(_stream_path(path, n, 'json'), encoding='utf-8') as f:
+            header = json.load(f)
+
+        if header.get('format') != FORMAT or header.get('version') != VERSION:
+            raise RuntimeError('Stream {} of "{}" has an unsupported '
+                'format.'.format(n, path))
+
+        self.info = acquisition.ChannelInfo(header['vendor'],
+                header['model'], header['serial_number'],
+                header['connection_id'], header['index'], header['name'],
+                header.get('device', 0))
+        self.unit = sr.Unit.get(header['unit'])
+        self.mqflags = [sr.QuantityFlag.get(i) for i in header['mqflags']]
+
+        t = self._map(_stream_path(path, n, 'time'), header['dtype'])
+        v = self._map(_stream_path(path, n, 'value'), header['dtype'])
+
+        # The files may differ in length if the recorder was interrupted.
+        n = min(len(t), len(v))
+        self.timestamps = t[:n]
+        self.values = v[:n]
+
+    def _map(self, filename, dtype):
+        itemsize = numpy.dtype(dtype).itemsize
+        n = os.path.getsize(filename) // itemsize
+        if not n:
+            # Empty files can't be mapped.
+            return numpy.empty(0, dtype=dtype)
+        # An interrupted write may have left a partial sample at the end.
+        return numpy.memmap(filename, dtype=dtype, mode='r', shape=(n,))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+class Recording(object):
+    '''Opens a recording for reading.'''
+
+    def __init__(self, path):
+        if not os.path.isdir(path):
+            raise RuntimeError('"{}" is not a recording.'.format(path))
+
+        self.streams = []
+        n = 0
+        while os.path.exists(_stream_path(path, n, 'json')):
+            self.streams.append(Stream(path, n))
+            n += 1
@@ -0,0 +1,172 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import acquisition
+import numpy
+import qtcompat
+import recording
+import time
+
+QtCore = qtcompat.QtCore
+
+class Replay(QtCore.QObject):
+    '''Plays back a recording, can be used in place of an 'Acquisition'.
+
+    The timestamps of the samples are mapped to the time they are sent, so
+    the rest of the program sees them like live data. At a speed of N, N
+    seconds of the recording are sent per second.
+    '''
+
+    '''Signal emitted the first time data for a channel is sent, see
+    'Acquisition.channelAdded'.'''
+    channelAdded = QtCore.Signal(int, object)
+
+    '''Signal emitted when new data is sent, see 'Acquisition.measured'.'''
+    measured = QtCore.Signal(object)
+
+    '''Signal emitted when the replay has stopped.'''
+    stopped = QtCore.Signal()
+
+    # Interval in milliseconds in which data is sent.
+    INTERVAL = 20
+
+    # Maximum number of samples of each stream sent at once when replaying
+    # as fast as possible.
+    FASTSAMPLES = 4096
+
+    # Minimum time in seconds between two samples sent.
+    MINSTEP = 1e-6
+
+    def __init__(self, path, speed=1.0):
+        '''Initializes the replay.
+
+        :param path: Directory of the recording.
+        :param speed: Playback speed, 0 plays back as fast as possible.
+        '''
+
+        super(self.__class__, self).__init__()
+
+        self._streams = recording.Recording(path).streams
+        self._speed = float(speed)
+        if self._speed < 0:
+            raise ValueError('The speed must not be negative.')
+
+        # Streams of the same channel (but with different units) share
+        # their handle.
+        uids = []
+        self._handles = []
+        for stream in self._streams:
+            if not stream.info.uid in uids:
+                uids.append(stream.info.uid)
+            self._handles.append(uids.index(stream.info.uid))
+
+        starts = [s.timestamps[0] for s in self._streams if len(s)]
+        self._t_start = min(starts) if starts else 0.0
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(0 if self._speed == 0 else Replay.INTERVAL)
+        self._timer.timeout.connect(self._tick)
+
+        self._pos = [0] * len(self._streams)
+
+    def is_running(self):
+        return self._timer.isActive()
+
+    @QtCore.Slot()
+    def start(self):
+        '''Starts the replay from the beginning.'''
+
+        sent = set()
+        for stream, handle in zip(self._streams, self._handles):
+            if not handle in sent:
+                sent.add(handle)
+                self.channelAdded.emit(handle, stream.info)
+
+        self._pos = [0] * len(self._streams)
+
+        # Samples up to 'self._last_ts' were sent with timestamps up to
+        # 'self._last_mapped'.
+        self._wall0 = time.time()
+        self._last_ts = self._t_start
+        self._last_mapped = self._wall0
+        self._first = True
+
+        self._timer.start()
+
+    @QtCore.Slot()
+    def stop(self):
+        if self.is_running():
+            self._timer.stop()
+            # Like the acquisition, signal the stop asynchronously.
+            QtCore.QTimer.singleShot(0, self.stopped.emit)
+
+    def _end(self):
+        '''Returns the timestamp (in the recording) up to which the samples
+        should be sent now.'''
+
+        if self._speed:
+            return self._t_start + (time.time() - self._wall0) * self._speed
+
+        ends = [s.timestamps[min(p + Replay.FASTSAMPLES, len(s)) - 1]
+                for s, p in zip(self._streams, self._pos) if p < len(s)]
+        return min(ends) if ends else self._last_ts
+
+    @QtCore.Slot()
+    def _tick(self):
+        end = self._end()
+        now = time.time()
+
+        batch = []
+        slices = []
+        for i, stream in enumerate(self._streams):
+            lo = self._pos[i]
+            hi = numpy.searchsorted(stream.timestamps, end, side='right')
+            if hi > lo:
+                slices.append((i, lo, hi))
+                self._pos[i] = hi
+
+        # Map the timestamps linearly so that the newest sample is sent with
+        # the current time. The samples are spread at least 'MINSTEP' apart,
+        # so they don't collapse when replaying as fast as possible (they can
+        # then be slightly ahead of the current time).
+        span = end - self._last_ts
+        if span > 0 or self._first:
+            k = (now - self._last_mapped) / span if span > 0 else 0.0
+            for i, lo, hi in slices:
+                d = numpy.diff(self._streams[i].timestamps[max(lo - 1, 0):hi])
+                d = d[d > 0]
+                if len(d):
+                    k = max(k, Replay.MINSTEP / d.min())
+
+            for i, lo, hi in slices:
+                stream = self._streams[i]
+                ts = stream.timestamps[lo:hi]
+                ts = self._last_mapped + (ts - self._last_ts) * k
+                batch.append(acquisition.Measurement(self._handles[i], ts,
+                        numpy.array(stream.values[lo:hi]), stream.unit,
+                        stream.mqflags, now))
+            self._last_mapped += span * k
+            self._last_ts = end
+            self._first = False
+
+        if batch:
+            self.measured.emit(batch)
+
+        if all(p >= len(s) for s, p in zip(self._streams, self._pos)):
+            self.stop()
@@ -0,0 +1,159 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import numpy
+
+class RingBuffer(object):
+    '''Circular buffer holding rows of float64 values in separate columns.
+
+    The first column is used as the key for trimming and must be sorted in
+    ascending order (it normally holds the timestamps).
+
+    Every value is stored twice, once at its position 'p' and once at
+    'p + capacity'. This way all stored rows can always be returned as
+    contiguous views into the arrays, without copying them.
+    '''
+
+    def __init__(self, columns=2, capacity=1024, maxcapacity=None):
+        '''Initializes the buffer.
+
+        :param columns: Number of columns of each row.
+        :param capacity: Number of rows the buffer can initially hold.
+        :param maxcapacity: Maximum number of rows. The buffer grows up to
+            this size, after that the oldest rows are overwritten. 'None'
+            lets the buffer grow without bounds.
+        '''
+
+        if maxcapacity is not None:
+            capacity = min(capacity, maxcapacity)
+
+        self._ncols = columns
+        self._maxcapacity = maxcapacity
+        self._allocate(max(capacity, 1))
+
+    def _allocate(self, capacity):
+        self._capacity = capacity
+        self._cols = [numpy.empty(2 * capacity) for _ in range(self._ncols)]
+        self._start = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    @property
+    def capacity(self):
+        '''The number of rows that fit into the buffer without growing it.'''
+        return self._capacity
+
+    def column(self, i):
+        '''Returns a contiguous (read-only by convention) view of column 'i'.'''
+        return self._cols[i][self._start:self._start + self._len]
+
+    def clear(self):
+        '''Removes all rows.'''
+        self._start = 0
+        self._len = 0
+
+    def _grow(self, needed):
+        '''Makes room for at least 'needed' rows, if the limit allows it.'''
+
+        capacity = self._capacity
+        while capacity < needed:
+            capacity *= 2
+        if self._maxcapacity is not None:
+            capacity = min(capacity, self._maxcapacity)
+        if capacity == self._capacity:
+            return
+
+        old = [self.column(i) for i in range(self._ncols)]
+        n = self._len
+        self._allocate(capacity)
+        for col, data in zip(self._cols, old):
+            col[:n] = data
+            col[capacity:capacity + n] = data
+        self._len = n
+
+    def _write(self, pos, data):
+        '''Writes the rows in 'data' starting at the (unmirrored) position
+        'pos', wrapping around at the end of the buffer.'''
+
+        cap = self._capacity
+        n = len(data[0])
+        k = min(n, cap - pos)
+        for col, d in zip(self._cols, data):
+            col[pos:pos + k] = d[:k]
+            col[pos + cap:pos + cap + k] = d[:k]
+            if k < n:
+                col[:n - k] = d[k:]
+                col[cap:cap + n - k] = d[k:]
+
+    def append(self, *row):
+        '''Appends a single row, one value per column.'''
+        self.extend(*[(v,) for v in row])
+
+    def extend(self, *columns):
+        '''Appends a block of rows, given as one sequence per column.'''
+
+        if len(columns) != self._ncols:
+            raise ValueError('Expected {} columns, got {}.'.format(
+                self._ncols, len(columns)))
+
+        columns = [numpy.asarray(c, dtype=numpy.float64) for c in columns]
+        n = len(columns[0])
+        if not n:
+            return
+
+        if self._len + n > self._capacity:
+            self._grow(self._len + n)
+
+        cap = self._capacity
+        if n > cap:
+            # Only the newest rows fit.
+            columns = [c[n - cap:] for c in columns]
+            n = cap
+
+        # Drop the oldest rows if there's not enough space left.
+        drop = max(self._len + n - cap, 0)
+        self._start = (self._start + drop) % cap
+        self._len -= drop
+
+        self._write((self._start + self._len) % cap, columns)
+        self._len += n
+
+    def trim(self, key):
+        '''Removes all rows whose first column is smaller than 'key'.'''
+
+        k = numpy.searchsorted(self.column(0), key, side='left')
+        self._start = (self._start + k) % self._capacity
+        self._len -= k
+        if not self._len:
+            self._start = 0
+
+    def truncate(self, key):
+        '''Removes all rows whose first column is greater than or equal
+        to 'key'.'''
+        self._len = numpy.searchsorted(self.column(0), key, side='left')
+
+    def range(self, lo, hi):
+        '''Returns the indices '(start, end)' (relative to the views returned
+        by 'column()') of the rows with 'lo <= key <= hi'.'''
+
+        keys = self.column(0)
+        return (numpy.searchsorted(keys, lo, side='left'),
+                numpy.searchsorted(keys, hi, side='right'))
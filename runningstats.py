@@ -0,0 +1,96 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+import math
+import numpy
+
+class RunningStatistics(object):
+    '''Count, minimum, maximum, mean and standard deviation of all values
+    added since the last reset.
+
+    The statistics are updated with every block of values, combining the
+    mean and the sum of squared deviations of the block with the previous
+    ones (the parallel form of Welford's algorithm), so the values don't
+    have to be kept.
+
+    Non-finite values (like the infinities sent for an overload) are only
+    counted in 'overloads', infinities also go into the minimum and
+    maximum.
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.overloads = 0
+        self.minimum = None
+        self.maximum = None
+        self._mean = 0.0
+
+        # Sum of the squared deviations from the mean.
+        self._m2 = 0.0
+
+    def add(self, values):
+        '''Adds a block of values.'''
+
+        values = numpy.asarray(values, dtype=numpy.float64)
+        finite = numpy.isfinite(values)
+        if not finite.all():
+            invalid = values[~finite]
+            self.overloads += len(invalid)
+            self._update_range(invalid[~numpy.isnan(invalid)])
+            values = values[finite]
+
+        n = len(values)
+        if not n:
+            return
+
+        mean = float(values.mean())
+        d = values - mean
+        m2 = float(numpy.dot(d, d))
+
+        total = self.count + n
+        delta = mean - self._mean
+        self._mean += delta * n / total
+        self._m2 += m2 + delta * delta * self.count * n / total
+        self.count = total
+
+        self._update_range(values)
+
+    def _update_range(self, values):
+        if not len(values):
+            return
+        lo = float(values.min())
+        hi = float(values.max())
+        self.minimum = lo if self.minimum is None else min(self.minimum, lo)
+        self.maximum = hi if self.maximum is None else max(self.maximum, hi)
+
+    @property
+    def mean(self):
+        '''The mean of the finite values, or 'None' if there are none.'''
+        return self._mean if self.count else None
+
+    @property
+    def stddev(self):
+        '''The (population) standard deviation of the finite values, or
+        'None' if there are none.'''
+        if not self.count:
+            return None
+        return math.sqrt(max(self._m2, 0.0) / self.count)
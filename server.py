@@ -0,0 +1,418 @@
+##
+## This file is part of the sigrok-meter project.
+##
+## Copyright (C) 2026 agent <agent@local>
+##
+## This program is free software; you can redistribute it and/or modify
+## it under the terms of the GNU General Public License as published by
+## the Free Software Foundation; either version 2 of the License, or
+## (at your option) any later version.
+##
+## This program is distributed in the hope that it will be useful,
+## but WITHOUT ANY WARRANTY; without even the implied warranty of
+## MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+## GNU General Public License for more details.
+##
+## You should have received a copy of the GNU General Public License
+## along with this program; if not, see <http://www.gnu.org/licenses/>.
+##
+
+'''Streaming of live measurements to other processes.
+
+Every message is a frame made of a 4 byte length (big endian, counting the
+rest of the frame), a 1 byte type and the payload. The server sends:
+
+  'C'  A channel: the handle (uint32, little endian) followed by a JSON
+       object with the fields of an 'acquisition.ChannelInfo'. Sent for
+       all channels when a client connects, and for every new channel.
+  'M'  A measurement: handle (uint32), unit id (int32), mq flags (the
+       bitwise or of the flag ids, uint64) and the number of samples N
+       (uint32), followed by N timestamps and N values (little endian
+       float64 each).
+
+Clients can send:
+
+  'S'  A subscription: a JSON list of objects, a measurement is sent if
+       its channel matches all fields of one of them (for example
+       '[{"model": "UT61E"}]'). An empty payload subscribes to all
+       channels, which is the default.
+
+Every client has a bounded queue of measurements. If a client can't keep
+up, its oldest measurements are dropped, the acquisition and the other
+clients are never held up. Channel frames are never dropped, and always
+sent before the measurements that are still queued.
+'''
+
+import acquisition
+import collections
+import errno
+import json
+import os
+import qtcompat
+import select
+import socket
+import stat
+import struct
+import threading
+
+QtCore = qtcompat.QtCore
+
+_LENGTH = struct.Struct('>I')
+_CHANNEL = struct.Struct('<I')
+_MEASUREMENT = struct.Struct('<IiQI')
+
+_INFOFIELDS = ('vendor', 'model', 'serial_number', 'connection_id', 'index',
+        'name', 'device')
+
+def _frame(kind, payload):
+    return _LENGTH.pack(len(payload) + 1) + kind + payload
+
+def channel_fields(info):
+    '''Returns the fields of an 'acquisition.ChannelInfo' as a dictionary
+    that can be serialized as JSON.'''
+    return dict((f, getattr(info, f)) for f in _INFOFIELDS)
+
+def channel_info(fields):
+    '''Returns the 'acquisition.ChannelInfo' with the 'fields' returned by
+    'channel_fields()'.'''
+    return acquisition.ChannelInfo(*[fields[f] for f in _INFOFIELDS])
+
+def encode_channel(handle, info):
+    '''Returns the frame announcing a channel.'''
+    return _frame(b'C', _CHANNEL.pack(handle) +
+            json.dumps(channel_fields(info)).encode('utf-8'))
+
+def encode_measurement(m):
+    '''Returns the frame of an 'acquisition.Measurement'.'''
+    flags = 0
+    for f in m.mqflags:
+        flags |= f.id
+    n = len(m.values)
+    t = m.timestamps.astype('<f8').tobytes()
+    v = m.values.astype('<f8').tobytes()
+    return _frame(b'M', _MEASUREMENT.pack(m.handle, m.unit.id, flags, n) +
+            t + v)
+
+def encode_subscription(filters=None):
+    '''Returns the frame of a subscription, see the module documentation.'''
+    if not filters:
+        return _frame(b'S', b'')
+    return _frame(b'S', json.dumps(filters).encode('utf-8'))
+
+def decode(kind, payload):
+    '''Decodes the payload of a frame.
+
+    Returns '(handle, ChannelInfo)' for channels, '(handle, unit id,
+    mq flags, timestamps, values)' for measurements (the arrays are
+    NumPy arrays using the memory of 'payload'), and the list of filters
+    for subscriptions.'''
+
+    import numpy
+
+    if kind == b'C':
+        handle, = _CHANNEL.unpack_from(payload)
+        d = json.loads(bytes(payload[_CHANNEL.size:]).decode('utf-8'))
+        return handle, channel_info(d)
+
+    if kind == b'M':
+        handle, unit, flags, n = _MEASUREMENT.unpack_from(payload)
+        data = numpy.frombuffer(payload, '<f8', 2 * n, _MEASUREMENT.size)
+        return handle, unit, flags, data[:n], data[n:]
+
+    if kind == b'S':
+        if not payload:
+            return []
+        filters = json.loads(bytes(payload).decode('utf-8'))
+        if not isinstance(filters, list) or \
+                not all(isinstance(f, dict) for f in filters):
+            raise ValueError('A subscription must be a list of objects.')
+        return filters
+
+    raise ValueError('Unknown frame type {!r}.'.format(kind))
+
+def recv_frame(sock):
+    '''Reads a frame from a blocking socket. Returns '(type, payload)', or
+    'None' if the connection was closed.'''
+
+    def recv_exactly(n):
+        parts = []
+        while n:
+            part = sock.recv(n)
+            if not part:
+                return None
+            parts.append(part)
+            n -= len(part)
+        return b''.join(parts)
+
+    header = recv_exactly(_LENGTH.size)
+    if header is None:
+        return None
+    length, = _LENGTH.unpack(header)
+    body = recv_exactly(length)
+    if body is None:
+        return None
+    return body[:1], body[1:]
+
+def parse_address(address):
+    '''Parses an address given on the command line: a path (containing a
+    '/') is a Unix socket, otherwise it is '[HOST:]PORT' with the host
+    defaulting to localhost. Returns '(family, address)'.'''
+
+    if '/' in address:
+        return socket.AF_UNIX, address
+
+    host, _, port = address.rpartition(':')
+    try:
+        port = int(port)
+    except ValueError:
+        raise ValueError('"{}" is not a valid address.'.format(address))
+    return socket.AF_INET, (host or '127.0.0.1', port)
+
+class _Client(object):
+    '''State of a connected client.'''
+
+    def __init__(self, sock, maxframes):
+        self.sock = sock
+        self.sock.setblocking(False)
+
+        # Channel frames and measurement frames waiting to be sent, and the
+        # rest of the frame being sent.
+        self.channels = []
+        self.queue = collections.deque(maxlen=maxframes)
+        self.sending = b''
+        self.dropped = 0
+
+        self.received = b''
+        self.filters = None
+
+        # The handles of the channels the client subscribed to.
+        self.handles = None
+
+    def enqueue(self, frame):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(frame)
+
+    def announce(self, frame):
+        self.channels.append(frame)
+
+    def next_frame(self):
+        '''Returns the next frame to send, or 'None'.'''
+        if self.channels:
+            return self.channels.pop(0)
+        if self.queue:
+            return self.queue.popleft()
+        return None
+
+    def wants_write(self):
+        return bool(self.sending or self.channels or self.queue)
+
+    def subscribe(self, filters, channels):
+        self.filters = filters or None
+        if self.filters is None:
+            self.handles = None
+        else:
+            self.handles = set(h for h, info in channels.items()
+                    if self.matches(info))
+
+    def matches(self, info):
+        if self.filters is None:
+            return True
+        return any(all(getattr(info, k, None) == v for k, v in f.items())
+                for f in self.filters)
+
+class Server(QtCore.QObject):
+    '''Publishes the measurements of an 'Acquisition' to the clients
+    connected to a local socket.
+
+    The sockets are handled by a background thread, the slots only queue
+    the frames.
+    '''
+
+    # Number of measurements queued per client before the oldest are
+    # dropped.
+    QUEUEFRAMES = 4096
+
+    def __init__(self, address):
+        '''Starts listening on 'address' (see 'parse_address()').'''
+
+        super(self.__class__, self).__init__()
+
+        family, addr = parse_address(address)
+        if family == socket.AF_UNIX and os.path.exists(addr):
+            # Left over from a previous run, but never remove anything else.
+            if not stat.S_ISSOCK(os.stat(addr).st_mode):
+                raise ValueError('"{}" exists and is not a socket.'.format(
+                    addr))
+            os.unlink(addr)
+
+        self._address = addr if family == socket.AF_UNIX else None
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self._listener.setsockopt(socket.SOL_SOCKET,
+                    socket.SO_REUSEADDR, 1)
+        self._listener.bind(addr)
+        self._listener.listen(8)
+        self._listener.setblocking(False)
+
+        self._lock = threading.Lock()
+        self._clients = []
+
+        # Maps from the handle of a channel to its 'ChannelInfo' and to
+        # its frame.
+        self._channels = {}
+        self._channelFrames = {}
+
+        # Used to wake up the thread when there is something to send.
+        self._wakeup, self._wakeupSender = socket.socketpair()
+        self._wakeupSender.setblocking(False)
+        self._running = True
+
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    @QtCore.Slot(int, object)
+    def add_channel(self, handle, info):
+        frame = encode_channel(handle, info)
+        with self._lock:
+            self._channels[handle] = info
+            self._channelFrames[handle] = frame
+            for c in self._clients:
+                c.announce(frame)
+                if c.handles is not None and c.matches(info):
+                    c.handles.add(handle)
+        self._wake()
+
+    @QtCore.Slot(object)
+    def write(self, batch):
+        '''Sends a batch of measurements to the subscribed clients.'''
+
+        with self._lock:
+            if not self._clients:
+                return
+
+            for m in batch:
+                frame = None
+                for c in self._clients:
+                    if c.handles is None or m.handle in c.handles:
+                        if frame is None:
+                            frame = encode_measurement(m)
+                        c.enqueue(frame)
+        self._wake()
+
+    @QtCore.Slot()
+    def close(self):
+        '''Disconnects all clients and stops listening.'''
+
+        if not self._running:
+            return
+        self._running = False
+        self._wake()
+        self._thread.join()
+
+        for c in self._clients:
+            c.sock.close()
+        self._clients = []
+        self._listener.close()
+        self._wakeup.close()
+        self._wakeupSender.close()
+        if self._address:
+            os.unlink(self._address)
+
+    def _wake(self):
+        try:
+            self._wakeupSender.send(b'x')
+        except socket.error:
+            # The buffer is full, the thread will wake up anyway.
+            pass
+
+    def _run(self):
+        while self._running:
+            with self._lock:
+                clients = list(self._clients)
+            readers = [self._listener, self._wakeup]
+            readers += [c.sock for c in clients]
+            writers = [c.sock for c in clients if c.wants_write()]
+
+            r, w, _ = select.select(readers, writers, [])
+
+            if self._wakeup in r:
+                self._wakeup.recv(4096)
+
+            if self._listener in r:
+                self._accept()
+
+            for c in clients:
+                try:
+                    if c.sock in r:
+                        self._receive(c)
+                    if c.sock in w:
+                        self._send(c)
+                except socket.error as e:
+                    if e.args[0] not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        self._disconnect(c)
+                except Exception:
+                    # Whatever the client did, it must not stop the thread
+                    # serving the others.
+                    self._disconnect(c)
+
+    def _accept(self):
+        try:
+            sock, _ = self._listener.accept()
+        except socket.error:
+            return
+
+        c = _Client(sock, Server.QUEUEFRAMES)
+        with self._lock:
+            for handle in sorted(self._channelFrames):
+                c.announce(self._channelFrames[handle])
+            self._clients.append(c)
+
+    def _disconnect(self, c):
+        with self._lock:
+            if c in self._clients:
+                self._clients.remove(c)
+        c.sock.close()
+
+    def _receive(self, c):
+        data = c.sock.recv(65536)
+        if not data:
+            self._disconnect(c)
+            return
+
+        c.received += data
+        while len(c.received) >= _LENGTH.size:
+            length, = _LENGTH.unpack_from(c.received)
+            end = _LENGTH.size + length
+            if len(c.received) < end:
+                break
+
+            kind = c.received[_LENGTH.size:_LENGTH.size + 1]
+            payload = c.received[_LENGTH.size + 1:end]
+            c.received = c.received[end:]
+
+            if kind != b'S':
+                continue
+            try:
+                filters = decode(kind, payload)
+            except ValueError:
+                # Invalid subscriptions are ignored.
+                continue
+            with self._lock:
+                c.subscribe(filters, self._channels)
+
+    def _send(self, c):
+        while True:
+            if not c.sending:
+                with self._lock:
+                    frame = c.next_frame()
+                if frame is None:
+                    return
+                c.sending = frame
+
+            n = c.sock.send(c.sending)
+            c.sending = c.sending[n:]
+            if c.sending:
+                # The socket buffer is full.
+                return
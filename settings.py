@@ -17,15 +17,84 @@
 ## along with this program; if not, see <http://www.gnu.org/licenses/>.
 ##
 
+import atexit
+import json
 import qtcompat
 import sigrok.core as sr
+import threading
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 QtCore = qtcompat.QtCore
 QtGui = qtcompat.QtGui
 
+class _Writer(object):
+    '''Writes changed settings to disk.
+
+    The changes are collected until no setting changed for 'DELAY'
+    milliseconds, and then written together from a background thread.
+    '''
+
+    DELAY = 500
+
+    def __init__(self):
+        # Maps from the key of a setting to its serialized value.
+        self._pending = {}
+
+        self._timer = QtCore.QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(_Writer.DELAY)
+        self._timer.timeout.connect(self._submit)
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def set(self, key, value):
+        '''Schedules writing a value. Must be called from the main thread.'''
+        self._pending[key] = value
+        self._timer.start()
+
+    def _submit(self):
+        if self._pending:
+            self._queue.put(self._pending)
+            self._pending = {}
+
+    def flush(self):
+        '''Writes all changes to disk, and waits until that's done.'''
+        self._timer.stop()
+        self._submit()
+        self._queue.join()
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                s = QtCore.QSettings()
+                for key, value in batch.items():
+                    s.setValue(key, value)
+                s.sync()
+            finally:
+                self._queue.task_done()
+
+_writer = None
+
+def flush():
+    '''Writes all changed settings to disk.'''
+    if _writer:
+        _writer.flush()
+
 class Setting(QtCore.QObject):
     '''Wrapper class around the raw 'QSettings' class that emits signals
-    when the value of the setting changes.'''
+    when the value of the setting changes.
+
+    The value is read from disk only once. Changes take effect (and are
+    signalled) immediately, but are written to disk later (see 'flush()').
+    '''
 
     '''Signal emitted when the setting has changed.'''
     changed = QtCore.Signal(object)
@@ -46,20 +115,21 @@ class Setting(QtCore.QObject):
         self._serialize = s if s else (lambda x: x)
         self._deserialize = d if d else (lambda x: x)
         self._value = None
+        self._loaded = False
 
     def value(self):
-        s = QtCore.QSettings()
-        v = s.value(self._key, self._default)
-        self._value = self._deserialize(v)
+        if not self._loaded:
+            s = QtCore.QSettings()
+            v = s.value(self._key, self._default)
+            self._value = self._deserialize(v)
+            self._loaded = True
         return self._value
 
     @QtCore.Slot(object)
     def setValue(self, value):
-        if value != self._value:
-            s = QtCore.QSettings()
-            s.setValue(self._key, self._serialize(value))
-            s.sync()
+        if value != self.value():
             self._value = value
+            _writer.set(self._key, self._serialize(value))
             self.changed.emit(self._value)
 
 class _SettingsGroup(object):
@@ -88,18 +158,38 @@ def _s_loglevel(l):
     '''Converts a sr.LogLevel into a string.'''
     return l.name
 
+def _d_scancache(s):
+    '''Converts a JSON string into the dictionary of cached scan results.'''
+    try:
+        d = json.loads(s)
+    except (TypeError, ValueError):
+        return {}
+    return d if isinstance(d, dict) else {}
+
+def _d_bool(s):
+    '''Converts a string (or a bool, depending on the backend) into a
+    bool.'''
+    return s in (True, 'true', '1', 1)
+
 def init():
     '''Creates the 'Settings' objects for all known settings and places them
     into the module's namespace.
 
-    A QApplication must have been created before this function can be called.
+    A QCoreApplication (or QApplication) must have been created before this
+    function can be called.
     '''
 
-    app = QtGui.QApplication.instance()
+    app = QtCore.QCoreApplication.instance()
     app.setApplicationName('sigrok-meter')
     app.setOrganizationName('sigrok')
     app.setOrganizationDomain('sigrok.org')
 
+    # Make sure that all changes are written when the program ends.
+    global _writer
+    _writer = _Writer()
+    app.aboutToQuit.connect(flush)
+    atexit.register(flush)
+
     mainwindow = _SettingsGroup()
     mainwindow.size = Setting('mainwindow/size', QtCore.QSize(900, 550))
     mainwindow.pos  = Setting('mainwindow/pos')
@@ -115,3 +205,12 @@ def init():
     logging.lines = Setting('logging/lines', 1000, d=int)
     logging.filename = Setting('logging/filename', '')
     globals()['logging'] = logging
+
+    acquisition = _SettingsGroup()
+    acquisition.isolate = Setting('acquisition/isolate', False, d=_d_bool)
+    globals()['acquisition'] = acquisition
+
+    devices = _SettingsGroup()
+    devices.scancache = Setting('devices/scancache', '{}',
+        s=json.dumps, d=_d_scancache)
+    globals()['devices'] = devices
@@ -19,13 +19,48 @@
 ## along with this program; if not, see <http://www.gnu.org/licenses/>.
 ##
 
+import decimation
+import history
+import instrumentation
+import io
+import json
+import numpy
+import os
+import shutil
+import ringbuffer
+import runningstats
+import select
 import sigrok.core as sr
+import socket
+import tempfile
+import threading
+import time
 import unittest
+import util
 
 if __name__ == '__main__':
     import qtcompat
     qtcompat.load_modules(False)
+    app = qtcompat.QtCore.QCoreApplication([])
     import acquisition
+    import datamodel
+    import headless
+    import logmodel
+    import mainwindow
+    import process
+    import recording
+    import replay
+    import server
+    import settings
+
+def process_events_until(condition, timeout=5):
+    '''Processes Qt events until 'condition()' is true or 'timeout' seconds
+    have passed. Returns the last result of 'condition()'.'''
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+    return condition()
 
 class TestDriverstringParsing(unittest.TestCase):
     def setUp(self):
@@ -65,5 +100,938 @@ class TestDriverstringParsing(unittest.TestCase):
         self.assertRaisesRegexp(ValueError, 'is not a valid driver string',
             self.a._parse_driverstring, 'd:=')
 
+class TestRingBuffer(unittest.TestCase):
+    def test_append_and_trim(self):
+        b = ringbuffer.RingBuffer(columns=2, capacity=4)
+        for i in range(10):
+            b.append(i, 10 * i)
+        self.assertEqual(len(b), 10)
+        self.assertTrue(b.capacity >= 10)
+
+        b.trim(7)
+        self.assertEqual(list(b.column(0)), [7, 8, 9])
+        self.assertEqual(list(b.column(1)), [70, 80, 90])
+
+    def test_wraparound(self):
+        b = ringbuffer.RingBuffer(columns=2, capacity=4, maxcapacity=4)
+        b.extend(range(3), range(3))
+        b.extend(range(3, 6), range(3, 6))
+        self.assertEqual(len(b), 4)
+        self.assertEqual(list(b.column(0)), [2, 3, 4, 5])
+        self.assertTrue(b.column(0).flags['C_CONTIGUOUS'])
+
+        b.extend(numpy.arange(6, 16), numpy.arange(6, 16))
+        self.assertEqual(list(b.column(1)), [12, 13, 14, 15])
+
+    def test_range(self):
+        b = ringbuffer.RingBuffer(columns=1)
+        b.extend(numpy.arange(10.0))
+        self.assertEqual(b.range(2.5, 5), (3, 6))
+
+class TestDecimation(unittest.TestCase):
+    def test_few_samples_unchanged(self):
+        x = numpy.arange(10.0)
+        xs, ys = decimation.minmax(x, x, 0, 9, 100)
+        self.assertEqual(list(xs), list(x))
+
+    def test_spike_kept(self):
+        x = numpy.arange(10000.0)
+        y = numpy.zeros(10000)
+        y[1234] = 5
+        y[8765] = -5
+        xs, ys = decimation.minmax(x, y, 0, 10000, 100)
+        self.assertTrue(len(xs) <= 200)
+        self.assertEqual(ys.max(), 5)
+        self.assertEqual(ys.min(), -5)
+        self.assertTrue(numpy.all(numpy.diff(xs) >= 0))
+
+    def test_range(self):
+        x = numpy.arange(10000.0)
+        xs, ys = decimation.minmax(x, x, 5000, 6000, 10)
+        self.assertEqual(xs[0], 4999)
+        self.assertEqual(xs[-1], 6001)
+
+class TestScrollingDecimator(unittest.TestCase):
+    def test_incremental(self):
+        x = numpy.arange(0, 100, 0.01)
+        y = numpy.sin(x)
+
+        d = decimation.ScrollingDecimator(
+            lambda x0, x1, w: decimation.minmax(x, y, x0, x1, w), offset=10)
+        for end in range(20, 100):
+            xs, ys = d.update(end - 10, end, 100)
+
+        full = decimation.ScrollingDecimator(
+            lambda x0, x1, w: decimation.minmax(x, y, x0, x1, w), offset=10)
+        fxs, fys = full.update(89, 99, 100)
+
+        self.assertEqual(list(xs[-len(fxs) + 2:]), list(fxs[2:]))
+        self.assertEqual(list(ys[-len(fxs) + 2:]), list(fys[2:]))
+        self.assertTrue(xs[0] >= 89 - 0.1 - 10 - 0.01)
+
+class TestHistory(unittest.TestCase):
+    def setUp(self):
+        self.h = history.History()
+        for k in range(0, 2 * 3600, 10):
+            ts = k + numpy.arange(100) * 0.1
+            self.h.extend(ts, numpy.sin(ts / 100.0))
+        self.now = 2 * 3600
+
+    def test_rollup(self):
+        tier = self.h.tiers[0]
+        self.assertEqual(tier.width, 1)
+        self.assertTrue(numpy.all(tier.column(history.Tier.COUNT) == 10))
+        self.assertTrue(len(self.h.raw) < 100 * 2 * 360)
+
+    def test_select(self):
+        for span in (10, 600, 3600, 2 * 3600):
+            x, y = self.h.select(self.now - span, self.now, 500)
+            self.assertTrue(len(x) <= 1000 + 2)
+            self.assertTrue(numpy.all(numpy.diff(x) >= 0))
+            self.assertTrue(x[0] <= self.now - span + 10)
+            self.assertTrue(x[-1] >= self.now - 1)
+
+class TestFormatting(unittest.TestCase):
+    def test_si_prefix(self):
+        self.assertEqual(util.format_value(0.0123456, sr.Unit.VOLT),
+            ('12.3456', 'm'))
+        self.assertEqual(util.format_value(4700, sr.Unit.OHM),
+            ('4.70000', 'k'))
+        self.assertEqual(util.format_value(21.5, sr.Unit.CELSIUS),
+            ('21.5000', ''))
+
+    def test_measurement(self):
+        self.assertEqual(
+            util.format_measurement(-0.5, sr.Unit.AMPERE,
+                [sr.QuantityFlag.AC]),
+            ('-500.000', 'mA AC'))
+        self.assertEqual(
+            util.format_measurement(float('inf'), sr.Unit.OHM, []),
+            (u'\u221E', u'\u03A9 '))
+
+    def test_statistics(self):
+        s = runningstats.RunningStatistics()
+        self.assertEqual(util.format_statistics(s, sr.Unit.VOLT), ('', ''))
+        s.add([float('nan')])
+        self.assertEqual(util.format_statistics(s, sr.Unit.VOLT),
+            ('', 'OL 1'))
+        s.add([0.5])
+        self.assertTrue(util.format_statistics(s, sr.Unit.VOLT)[1].endswith(
+            'n 1   OL 1'))
+
+class TestRunningStatistics(unittest.TestCase):
+    def test_blocks(self):
+        # A large offset makes the naive sum of squares inaccurate.
+        values = numpy.random.normal(1e6, 3, 10007)
+        s = runningstats.RunningStatistics()
+        for block in numpy.array_split(values, 37):
+            s.add(block)
+        self.assertEqual(s.count, len(values))
+        self.assertEqual(s.minimum, values.min())
+        self.assertEqual(s.maximum, values.max())
+        self.assertAlmostEqual(s.mean, values.mean(), places=6)
+        self.assertAlmostEqual(s.stddev, values.std(), places=6)
+
+    def test_reset(self):
+        s = runningstats.RunningStatistics()
+        s.add([1.0, 2.0])
+        s.reset()
+        self.assertEqual(s.count, 0)
+        self.assertEqual(s.mean, None)
+        s.add([5.0])
+        self.assertEqual((s.minimum, s.maximum, s.mean, s.stddev),
+            (5.0, 5.0, 5.0, 0.0))
+
+    def test_overload(self):
+        s = runningstats.RunningStatistics()
+        s.add([1.0, 2.0])
+        s.add([float('inf')])
+        s.add([3.0, float('nan'), float('-inf')])
+        self.assertEqual(s.count, 3)
+        self.assertEqual(s.overloads, 3)
+        self.assertEqual(s.mean, 2.0)
+        self.assertAlmostEqual(s.stddev, numpy.std([1.0, 2.0, 3.0]))
+        self.assertEqual(s.minimum, float('-inf'))
+        self.assertEqual(s.maximum, float('inf'))
+
+class TestDataModel(unittest.TestCase):
+    def test_frame(self):
+        model = datamodel.MeasurementDataModel(None)
+        for i in range(2):
+            model.add_channel(i, acquisition.ChannelInfo('Vendor', 'Model',
+                'SN', 'conn', i, 'P{}'.format(i + 1)))
+        changes = []
+        model.dataChanged.connect(
+            lambda first, last, *args: changes.append((first.row(),
+                last.row())))
+
+        for i in range(5):
+            t = numpy.array([time.time()])
+            model.update([acquisition.Measurement(i % 2, t,
+                numpy.array([float(i)]), sr.Unit.VOLT, [])])
+        self.assertEqual(changes, [])
+
+        # All batches of a frame result in a single update of the view,
+        # showing the latest values.
+        self.assertTrue(process_events_until(lambda: changes))
+        process_events_until(lambda: False, 0.1)
+        self.assertEqual(changes, [(0, 1)])
+        self.assertEqual(model.data(model.index(0, 0)),
+            util.format_measurement(4.0, sr.Unit.VOLT, []))
+        self.assertEqual(model.data(model.index(1, 0)),
+            util.format_measurement(3.0, sr.Unit.VOLT, []))
+
+    def test_overload(self):
+        model = datamodel.MeasurementDataModel(None)
+        info = acquisition.ChannelInfo('Vendor', 'Model', 'SN', 'conn', 0,
+            'P1')
+        model.add_channel(0, info)
+        t = numpy.array([1.0, 2.0, 3.0])
+        model.update([acquisition.Measurement(0, t[:1],
+            numpy.array([float('inf')]), sr.Unit.VOLT, [])])
+        model.update([acquisition.Measurement(0, t,
+            numpy.array([1.0, float('inf'), 3.0]), sr.Unit.VOLT, [])])
+
+        # The overloads are counted, but not drawn.
+        stats = model.statistics(info.uid)[sr.Unit.VOLT]
+        self.assertEqual((stats.count, stats.overloads), (2, 2))
+        self.assertEqual(model.rows()[0].traces[sr.Unit.VOLT].count, 2)
+
+        self.assertTrue(process_events_until(lambda:
+            model.data(model.index(0, 0), model.summaryRole)[1]))
+        summary = model.data(model.index(0, 0), model.summaryRole)
+        self.assertTrue(summary[1].endswith('OL 2'))
+
+class TestInstrumentation(unittest.TestCase):
+    def test_histogram(self):
+        h = instrumentation.RollingHistogram(window=10)
+        for i in range(100):
+            h.add(0.001 * (i + 1), 1000.0)
+        counts = h.counts(1000.5)
+        self.assertEqual(counts.sum(), 100)
+        # The percentiles are rounded up to the edge of their bucket.
+        self.assertTrue(0.05 <= h.percentile(counts, 50) < 0.07)
+        self.assertTrue(0.1 <= h.percentile(counts, 100) < 0.13)
+        # Old values drop out of the window.
+        self.assertEqual(h.counts(1010.0).sum(), 0)
+
+    def test_rate(self):
+        c = instrumentation.RateCounter(window=10)
+        c.add(5, 1000.2)
+        c.add(7, 1000.7)
+        c.add(1, 1001.1)
+        self.assertEqual(c.rate(1001.5), 12)
+        self.assertEqual(c.rate(1003.0), 0)
+        self.assertEqual(c.total, 13)
+
+    def test_display_latency(self):
+        p = instrumentation.Pipeline()
+        p.delivered(100.0, 100.1)
+        p.delivered(100.2, 100.3)
+        p.rendered(100.5)
+        stats = p.snapshot(100.6)
+        self.assertEqual(stats['stages']['display']['count'], 2)
+        self.assertEqual(stats['counters']['batches']['total'], 2)
+        self.assertEqual(stats['counters']['renders']['total'], 1)
+
+    def test_display_paused(self):
+        p = instrumentation.Pipeline()
+        p.delivered(100.0, 100.1)
+        p.set_display_paused(True)
+        p.delivered(100.2, 100.3)
+        p.set_display_paused(False)
+        p.delivered(500.0, 500.1)
+        p.rendered(500.2)
+
+        # Only the batch delivered after the pause is counted.
+        stats = p.snapshot(500.3)
+        self.assertEqual(stats['stages']['display']['count'], 1)
+        self.assertEqual(stats['counters']['batches']['total'], 3)
+
+class TestPlotUpdates(unittest.TestCase):
+    class Window(object):
+        '''Stands in for the 'MainWindow', without any widgets.'''
+
+        def __init__(self):
+            self.acquisition = self
+            self.running = True
+            self.on_screen = True
+            self.updates = 0
+            self._plot_update_timer = qtcompat.QtCore.QTimer()
+            self._plot_update_timer.setInterval(10)
+            self._plot_update_timer.timeout.connect(self._updatePlots)
+
+        def is_running(self):
+            return self.running
+
+        def _plotsOnScreen(self):
+            return self.on_screen
+
+        def _updatePlots(self):
+            self.updates += 1
+
+    def schedule(self, window):
+        mainwindow.MainWindow.__dict__['_schedulePlotUpdates'](window)
+
+    def tearDown(self):
+        instrumentation.pipeline.set_display_paused(False)
+
+    def test_hidden(self):
+        w = self.Window()
+        timer = w._plot_update_timer
+        self.schedule(w)
+        self.assertEqual(w.updates, 1)
+        self.assertTrue(process_events_until(lambda: w.updates >= 3))
+
+        # No updates while the plots can't be seen.
+        w.on_screen = False
+        self.schedule(w)
+        self.assertFalse(timer.isActive())
+        self.assertTrue(instrumentation.pipeline._display_paused)
+        n = w.updates
+        process_events_until(lambda: False, 0.1)
+        self.assertEqual(w.updates, n)
+
+        # The plots are brought up to date at once when they are shown.
+        w.on_screen = True
+        self.schedule(w)
+        self.assertEqual(w.updates, n + 1)
+        self.assertTrue(timer.isActive())
+        self.assertFalse(instrumentation.pipeline._display_paused)
+
+        # Scheduling again doesn't cause an extra update.
+        self.schedule(w)
+        self.assertEqual(w.updates, n + 1)
+
+        w.running = False
+        self.schedule(w)
+        self.assertFalse(timer.isActive())
+
+class TestScanCache(unittest.TestCase):
+    class Device(object):
+        vendor = 'Vendor'
+        model = 'Model'
+
+        def __init__(self, conn):
+            self.conn = conn
+
+        def connection_id(self):
+            return self.conn
+
+        def serial_number(self):
+            return ''
+
+        def open(self):
+            pass
+
+    class Driver(object):
+        def __init__(self, conns):
+            self.conns = conns
+            self.scans = []
+
+        def scan(self, **opts):
+            self.scans.append(opts)
+            conn = opts.get('conn')
+            return [TestScanCache.Device(c) for c in self.conns
+                    if conn is None or c == conn]
+
+    class Session(object):
+        def add_datafeed_callback(self, callback):
+            pass
+
+        def set_stopped_callback(self, callback):
+            pass
+
+    class Context(object):
+        def __init__(self, driver):
+            self.drivers = {'drv': driver}
+
+        def create_session(self):
+            return TestScanCache.Session()
+
+    def open(self, conns, cached):
+        driver = self.Driver(conns)
+        acq = acquisition.Acquisition(self.Context(driver))
+        device = acq.open_device('drv', '', cached)
+        return device.conn, driver.scans
+
+    def test_probe(self):
+        cached = acquisition.device_identity(self.Device('b'))
+        self.assertEqual(self.open(['a', 'b'], cached),
+            ('b', [{'conn': 'b'}]))
+
+    def test_fallback(self):
+        cached = acquisition.device_identity(self.Device('c'))
+        self.assertEqual(self.open(['a', 'b'], cached),
+            ('a', [{'conn': 'c'}, {}]))
+
+    def test_usb(self):
+        # The port of a USB device can't be used to probe for it.
+        cached = acquisition.device_identity(self.Device('1-1.2'))
+        self.assertFalse('conn' in cached)
+        self.assertEqual(self.open(['1-1.1', '1-1.2'], cached),
+            ('1-1.2', [{}]))
+
+class TestDeviceOpener(unittest.TestCase):
+    class Acquisition(object):
+        '''Records how the devices are opened.'''
+
+        def __init__(self):
+            self.lock = threading.Lock()
+            self.threads = set()
+            self.active = {}
+
+            # The largest number of devices opened at once, in total and
+            # of a single driver.
+            self.peak = 0
+            self.driver_peak = 0
+
+        def open_device(self, driverstring, configstring, cached):
+            name = driverstring.split(':', 1)[0]
+            with self.lock:
+                self.threads.add(threading.current_thread().ident)
+                self.active[name] = self.active.get(name, 0) + 1
+                self.peak = max(self.peak, sum(self.active.values()))
+                self.driver_peak = max(self.driver_peak, self.active[name])
+            time.sleep(0.05)
+            with self.lock:
+                self.active[name] -= 1
+
+            if name == 'bad':
+                raise RuntimeError('No device found.')
+            return (driverstring, configstring, cached)
+
+    def test_open(self):
+        acq = self.Acquisition()
+        drivers = [('a:conn=1', ''), ('a:conn=2', ''), ('b', 'x=1'),
+                ('bad', '')]
+        cache = {'b': {'model': 'Model'}}
+        pool = qtcompat.QtCore.QThreadPool()
+        opener = acquisition.DeviceOpener(acq, drivers, cache, pool)
+
+        opened, failed, progress, finished = [], [], [], []
+        opener.opened.connect(lambda ds, device: opened.append(device))
+        opener.failed.connect(lambda ds, msg: failed.append((ds, msg)))
+        opener.progress.connect(lambda n, total: progress.append((n, total)))
+        opener.finished.connect(lambda: finished.append(True))
+        opener.start()
+
+        self.assertTrue(process_events_until(lambda: finished))
+        pool.waitForDone()
+        self.assertEqual(sorted(opened), [('a:conn=1', '', None),
+            ('a:conn=2', '', None), ('b', 'x=1', {'model': 'Model'})])
+        self.assertEqual(failed, [('bad', 'No device found.')])
+        self.assertEqual(progress, [(1, 4), (2, 4), (3, 4), (4, 4)])
+        self.assertEqual(finished, [True])
+
+        # The drivers are used concurrently, but every driver from a single
+        # thread at a time, and never from the one running the events.
+        self.assertTrue(acq.peak > 1)
+        self.assertEqual(acq.driver_peak, 1)
+        self.assertFalse(threading.current_thread().ident in acq.threads)
+
+    def test_no_devices(self):
+        opener = acquisition.DeviceOpener(self.Acquisition(), [])
+        finished = []
+        opener.finished.connect(lambda: finished.append(True))
+        opener.start()
+        self.assertEqual(finished, [True])
+
+class TestBatching(unittest.TestCase):
+    class Channel(object):
+        def __init__(self, index):
+            self.index = index
+            self.name = 'P{}'.format(index + 1)
+
+    class Payload(object):
+        def __init__(self, channels, data):
+            self.channels = channels
+            self.data = data
+            self.unit = sr.Unit.VOLT
+            self.mq_flags = []
+
+    class Packet(object):
+        def __init__(self, payload):
+            self.type = sr.PacketType.ANALOG
+            self.payload = payload
+
+    def test_jitter(self):
+        acq = acquisition.Acquisition(
+            TestScanCache.Context(TestScanCache.Driver([])))
+        acq._samplerates['rate'] = 10.0
+        acq._samplerates['norate'] = None
+
+        # The second packet arrives early, the third one late.
+        for key in ('rate', 'norate'):
+            ts = numpy.concatenate([acq._timestamps(key, now, 10)
+                for now in (100.0, 100.5, 102.5)])
+            self.assertTrue(numpy.all(numpy.diff(ts) >= 0), key)
+
+        # Early packets continue the previous one at the samplerate.
+        ts = acq._timestamps('rate', 102.6, 10)
+        self.assertAlmostEqual(ts[0], 102.6)
+        self.assertAlmostEqual(ts[-1], 103.5)
+
+    def test_channels(self):
+        acq = acquisition.Acquisition(
+            TestScanCache.Context(TestScanCache.Driver([])))
+        channels = {}
+        acq.channelAdded.connect(
+            lambda handle, info: channels.__setitem__(handle, info))
+        batches = []
+        acq.measured.connect(batches.append)
+
+        device = TestScanCache.Device('a')
+        for i in range(2):
+            data = numpy.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]) + i
+            acq._datafeed_callback(device, self.Packet(self.Payload(
+                [self.Channel(0), self.Channel(1)], data)))
+        acq.flush()
+
+        # Every packet is split into one measurement per channel, the
+        # channels keep their handles.
+        batch = batches[0]
+        self.assertEqual(len(batch), 4)
+        self.assertEqual(len(channels), 2)
+        self.assertEqual([channels[m.handle].name for m in batch],
+            ['P1', 'P2', 'P1', 'P2'])
+        self.assertEqual(batch[0].handle, batch[2].handle)
+        self.assertNotEqual(batch[0].handle, batch[1].handle)
+        self.assertTrue(numpy.array_equal(batch[1].values, [4.0, 5.0, 6.0]))
+        self.assertTrue(numpy.array_equal(batch[2].values, [2.0, 3.0, 4.0]))
+        self.assertEqual(len(batch[0].timestamps), 3)
+        self.assertTrue(numpy.array_equal(batch[0].timestamps,
+            batch[1].timestamps))
+
+    def test_channel_before_measurement(self):
+        acq = acquisition.Acquisition(
+            TestScanCache.Context(TestScanCache.Driver([])))
+        events = []
+        acq.channelAdded.connect(lambda handle, info: events.append('c'))
+        acq.measured.connect(lambda batch: events.append('m'))
+
+        # The data arrives on another thread, and the batch is flushed by
+        # the timer before the events of that thread are processed.
+        device = TestScanCache.Device('a')
+        packet = self.Packet(self.Payload([self.Channel(0)],
+            numpy.array([1.0, 2.0])))
+        t = threading.Thread(target=acq._datafeed_callback,
+            args=(device, packet))
+        t.start()
+        t.join()
+        acq.flush()
+        process_events_until(lambda: False, 0.1)
+
+        self.assertEqual(events, ['c', 'm'])
+        self.assertEqual(acq.statistics.samples, 2)
+
+    def test_arrival(self):
+        acq = acquisition.Acquisition(
+            TestScanCache.Context(TestScanCache.Driver([])))
+        batches = []
+        acq.measured.connect(batches.append)
+
+        device = TestScanCache.Device('a')
+        acq._samplerates[acq._device_key(device)] = 1.0
+        before = time.time()
+        for i in range(2):
+            acq._datafeed_callback(device, self.Packet(self.Payload(
+                [self.Channel(0)], numpy.array([1.0, 2.0]))))
+        acq.flush()
+        after = time.time()
+
+        # The second packet continues the first one at the samplerate, so
+        # its timestamps are ahead of its arrival.
+        m = batches[0][-1]
+        self.assertTrue(before <= m.arrival <= after)
+        self.assertTrue(m.timestamps[-1] > after)
+
+class TestIsolation(unittest.TestCase):
+    def test_two_devices(self):
+        context = sr.Context_create()
+        acq = acquisition.Acquisition(context, isolate=True)
+
+        # The threads the data feed callbacks run on.
+        threads = set()
+        callback = acq._datafeed_callback
+        def record(device, packet, devkey=None):
+            threads.add(threading.current_thread().ident)
+            callback(device, packet, devkey)
+        acq._datafeed_callback = record
+
+        channels = {}
+        acq.channelAdded.connect(
+            lambda handle, info: channels.__setitem__(handle, info.uid))
+
+        for i in range(2):
+            acq.add_device('demo:analog_channels=1', 'samplerate=100')
+
+        stopped = []
+        acq.stopped.connect(lambda: stopped.append(True))
+        acq.start()
+        process_events_until(lambda: len(threads) >= 2)
+        acq.stop()
+        self.assertTrue(process_events_until(lambda: stopped))
+
+        # Every device ran on its own thread, none on the GUI thread.
+        self.assertEqual(len(threads), 2)
+        self.assertFalse(threading.current_thread().ident in threads)
+        self.assertFalse(acq.is_running())
+
+        # The identical devices have separate channels.
+        self.assertEqual(len(channels), 2)
+        self.assertEqual(len(set(channels.values())), 2)
+
+class TestLogModel(unittest.TestCase):
+    def test_ring(self):
+        m = logmodel.LogModel(4)
+        for i in range(3):
+            m.append(str(i))
+        m._flush()
+        self.assertEqual(m.lines(), ['0', '1', '2'])
+
+        for i in range(3, 6):
+            m.append(str(i))
+        m._flush()
+        self.assertEqual(m.rowCount(), 4)
+        self.assertEqual(m.lines(), ['2', '3', '4', '5'])
+
+        m.setCapacity(2)
+        self.assertEqual(m.lines(), ['4', '5'])
+
+class TestSettings(unittest.TestCase):
+    def setUp(self):
+        # Don't touch the settings of the user.
+        self.path = tempfile.mkdtemp()
+        QSettings = qtcompat.QtCore.QSettings
+        QSettings.setDefaultFormat(QSettings.IniFormat)
+        QSettings.setPath(QSettings.IniFormat, QSettings.UserScope,
+            self.path)
+        app.setOrganizationName('sigrok')
+        app.setApplicationName('sigrok-meter-test')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_debounce(self):
+        w = settings._Writer()
+        w._timer.setInterval(50)
+        batches = []
+        put = w._queue.put
+        def record(batch):
+            batches.append(dict(batch))
+            put(batch)
+        w._queue.put = record
+
+        for i in range(3):
+            w.set('test/a', str(i))
+        w.set('test/b', 'x')
+        self.assertEqual(batches, [])
+
+        # The changes are written together, once they settled.
+        self.assertTrue(process_events_until(lambda: batches))
+        w._queue.join()
+        self.assertEqual(batches, [{'test/a': '2', 'test/b': 'x'}])
+        self.assertEqual(qtcompat.QtCore.QSettings().value('test/a'), '2')
+
+    def test_flush(self):
+        w = settings._Writer()
+        w.set('test/a', '1')
+        w.flush()
+        self.assertFalse(w._timer.isActive())
+        self.assertEqual(qtcompat.QtCore.QSettings().value('test/a'), '1')
+
+class TestStreamWriter(unittest.TestCase):
+    def write(self, fmt, maxsamples=None):
+        f = io.StringIO()
+        w = headless.StreamWriter(f, fmt, maxsamples)
+        done = []
+        w.done.connect(lambda: done.append(True))
+        for i in range(2):
+            w.add_channel(i, acquisition.ChannelInfo('Vendor', 'Model', '',
+                '', i, 'P{}'.format(i + 1)))
+
+        t = numpy.array([1.0, 2.0])
+        w.write([
+            acquisition.Measurement(0, t, numpy.array([0.5, 1.5]),
+                sr.Unit.VOLT, [sr.QuantityFlag.DC]),
+            acquisition.Measurement(1, t, numpy.array([2.5, float('inf')]),
+                sr.Unit.VOLT, [sr.QuantityFlag.DC])])
+        w.write([acquisition.Measurement(0, t + 2, numpy.array([3.0, 4.0]),
+            sr.Unit.VOLT, [sr.QuantityFlag.DC])])
+        return f.getvalue().splitlines(), done
+
+    def test_csv(self):
+        lines, done = self.write('csv')
+        self.assertEqual(lines, [
+            'time,channel,value,unit,flags',
+            '1.000000,"Vendor Model, P1",0.5,V,DC',
+            '2.000000,"Vendor Model, P1",1.5,V,DC',
+            '1.000000,"Vendor Model, P2",2.5,V,DC',
+            '2.000000,"Vendor Model, P2",inf,V,DC',
+            '3.000000,"Vendor Model, P1",3.0,V,DC',
+            '4.000000,"Vendor Model, P1",4.0,V,DC'])
+        self.assertEqual(done, [])
+
+    def test_jsonl(self):
+        lines, done = self.write('jsonl')
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(json.loads(lines[0]), {'time': 1.0,
+            'channel': 'Vendor Model, P1', 'value': 0.5, 'unit': 'V',
+            'flags': 'DC'})
+        # JSON has no infinity.
+        self.assertEqual(json.loads(lines[3])['value'], None)
+
+    def test_samples(self):
+        # The limit is reached in the middle of the second channel.
+        lines, done = self.write('csv', 3)
+        self.assertEqual(lines[1:], [
+            '1.000000,"Vendor Model, P1",0.5,V,DC',
+            '2.000000,"Vendor Model, P1",1.5,V,DC',
+            '1.000000,"Vendor Model, P2",2.5,V,DC'])
+        self.assertEqual(done, [True])
+
+    def test_unknown_format(self):
+        self.assertRaises(ValueError, headless.StreamWriter, io.StringIO(),
+            'xml')
+
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_roundtrip(self):
+        info = acquisition.ChannelInfo('Vendor', 'Model', 'SN', 'conn', 0,
+            'P1')
+        r = recording.Recorder(os.path.join(self.path, 'rec'))
+        r.add_channel(0, info)
+        for i in range(3):
+            t = numpy.arange(5000.0) + 5000 * i
+            r.write([acquisition.Measurement(0, t, t * 2, sr.Unit.VOLT,
+                [sr.QuantityFlag.DC])])
+        r.close()
+
+        rec = recording.Recording(os.path.join(self.path, 'rec'))
+        self.assertEqual(len(rec.streams), 1)
+        stream = rec.streams[0]
+        self.assertEqual(stream.info.uid, info.uid)
+        self.assertEqual(stream.unit, sr.Unit.VOLT)
+        self.assertEqual(len(stream), 15000)
+        self.assertEqual(stream.values[-1], 2 * 14999)
+
+    def test_interrupted(self):
+        path = os.path.join(self.path, 'rec')
+        r = recording.Recorder(path)
+        r.add_channel(0, acquisition.ChannelInfo('V', 'M', '', '', 0, 'P1'))
+        t = numpy.arange(10.0)
+        r.write([acquisition.Measurement(0, t, t, sr.Unit.VOLT, [])])
+        r.close()
+
+        # A partial sample at the end of one file.
+        with open(os.path.join(path, 'stream-0.value'), 'ab') as f:
+            f.write(b'\0\0\0\0')
+
+        stream = recording.Recording(path).streams[0]
+        self.assertEqual(len(stream), 10)
+
+    def test_write_after_close(self):
+        path = os.path.join(self.path, 'rec')
+        r = recording.Recorder(path)
+        r.add_channel(0, acquisition.ChannelInfo('V', 'M', '', '', 0, 'P1'))
+        t = numpy.arange(10.0)
+        r.write([acquisition.Measurement(0, t, t, sr.Unit.VOLT, [])])
+        r.close()
+        r.write([acquisition.Measurement(0, t, t, sr.Unit.VOLT, [])])
+        r.close()
+
+        self.assertEqual(len(recording.Recording(path).streams[0]), 10)
+
+    def test_unknown_channel(self):
+        path = os.path.join(self.path, 'rec')
+        r = recording.Recorder(path)
+        r.add_channel(0, acquisition.ChannelInfo('V', 'M', '', '', 0, 'P1'))
+        t = numpy.arange(10.0)
+        r.write([acquisition.Measurement(1, t, t, sr.Unit.VOLT, []),
+            acquisition.Measurement(0, t, t, sr.Unit.VOLT, [])])
+        r.close()
+
+        # The measurements of the channel that wasn't announced are skipped.
+        self.assertEqual(len(recording.Recording(path).streams), 1)
+
+    def test_replay(self):
+        path = os.path.join(self.path, 'rec')
+        r = recording.Recorder(path)
+        r.add_channel(0, acquisition.ChannelInfo('V', 'M', '', '', 0, 'P1'))
+        t = numpy.arange(20000.0)
+        r.write([acquisition.Measurement(0, t, t, sr.Unit.VOLT, [])])
+        r.close()
+
+        batches = []
+        p = replay.Replay(path, speed=0)
+        p.measured.connect(batches.append)
+        p.start()
+        while p.is_running():
+            app.processEvents()
+
+        ts = numpy.concatenate([m.timestamps for b in batches for m in b])
+        vs = numpy.concatenate([m.values for b in batches for m in b])
+        self.assertEqual(len(vs), 20000)
+        self.assertTrue(numpy.array_equal(vs, t))
+        self.assertTrue(numpy.all(numpy.diff(ts) > 0))
+
+class TestSharedRing(unittest.TestCase):
+    def setUp(self):
+        self.ring = process.SharedRing.create(100)
+        self.reader = process.SharedRing(self.ring.path, 100)
+
+    def tearDown(self):
+        self.reader.close()
+        self.ring.unlink()
+        self.ring.close()
+
+    def frame(self, n):
+        return server._frame(b'X', bytes(bytearray([n] * n)))
+
+    def test_wrap(self):
+        # The frames don't fit into the rest of the buffer several times.
+        for i in range(1, 30):
+            self.assertTrue(self.ring.write(self.frame(i % 20 + 1)))
+            frames = self.reader.read()
+            self.assertEqual(len(frames), 1)
+            kind, payload = frames[0]
+            self.assertEqual(kind, b'X')
+            self.assertEqual(bytes(payload),
+                bytes(bytearray([i % 20 + 1] * (i % 20 + 1))))
+        self.assertEqual(self.reader.overruns, 0)
+
+    def test_overrun(self):
+        self.assertFalse(self.ring.write(self.frame(100)))
+        for i in range(10):
+            self.ring.write(self.frame(20))
+        self.assertEqual(self.reader.read(), [])
+        self.assertEqual(self.reader.overruns, 1)
+
+        # Reading continues with the next frame.
+        self.ring.write(self.frame(5))
+        self.assertEqual(len(self.reader.read()), 1)
+
+    def test_write_in_progress(self):
+        self.ring.write(self.frame(20))
+        self.ring.write(self.frame(20))
+
+        # The writer announced a frame that overwrites the first one, but
+        # didn't finish it.
+        head = self.ring._head()
+        process.SharedRing._HEAD.pack_into(self.ring._map, 0, head, head + 60)
+        self.assertEqual(self.reader.read(), [])
+        self.assertEqual(self.reader.overruns, 1)
+
+    def test_decode(self):
+        info = acquisition.ChannelInfo('Vendor', 'Model', 'SN', 'conn', 1,
+            'P2')
+        t = numpy.arange(3.0)
+        m = acquisition.Measurement(7, t, t * 2, sr.Unit.VOLT,
+            [sr.QuantityFlag.DC])
+        ring = process.SharedRing.create(1000)
+        reader = process.SharedRing(ring.path, 1000)
+        ring.unlink()
+        ring.write(server.encode_channel(7, info))
+        ring.write(server.encode_measurement(m))
+
+        (c, cp), (k, mp) = reader.read()
+        handle, decoded = server.decode(c, cp)
+        self.assertEqual(handle, 7)
+        self.assertEqual(decoded.uid, info.uid)
+        self.assertEqual(decoded.name, 'P2')
+
+        handle, unit, flags, ts, vs = server.decode(k, mp)
+        self.assertEqual((handle, unit, flags),
+            (7, sr.Unit.VOLT.id, sr.QuantityFlag.DC.id))
+        self.assertTrue(numpy.array_equal(ts, t))
+        self.assertTrue(numpy.array_equal(vs, t * 2))
+        self.assertEqual(reader.overruns, 0)
+        reader.close()
+        ring.close()
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_invalid_subscription(self):
+        for payload in (b'{"model": "x"}', b'[1]', b'"x"', b'[{'):
+            self.assertRaises(ValueError, server.decode, b'S', payload)
+        self.assertEqual(server.decode(b'S', b'[{"model": "x"}]'),
+            [{'model': 'x'}])
+
+    def test_existing_file(self):
+        path = os.path.join(self.path, 'file')
+        with open(path, 'w') as f:
+            f.write('data')
+        self.assertRaises(ValueError, server.Server, path)
+        self.assertTrue(os.path.exists(path))
+
+    def test_queue(self):
+        a, b = socket.socketpair()
+        c = server._Client(a, 2)
+        for i in range(5):
+            c.enqueue(i)
+        c.announce('C')
+
+        # Only measurements are dropped, channels are sent first.
+        frames = []
+        while c.wants_write():
+            frames.append(c.next_frame())
+        self.assertEqual(frames, ['C', 3, 4])
+        self.assertEqual(c.dropped, 3)
+        a.close()
+        b.close()
+
+    def test_stream(self):
+        address = os.path.join(self.path, 'socket')
+        s = server.Server(address)
+        s.add_channel(0, acquisition.ChannelInfo('V', 'A', '', '', 0, 'P1'))
+        s.add_channel(1, acquisition.ChannelInfo('V', 'B', '', '', 0, 'P1'))
+
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.connect(address)
+        client.settimeout(5)
+        client.sendall(server.encode_subscription([{'model': 'B'}]))
+
+        handles = []
+        for i in range(2):
+            handle, info = server.decode(*server.recv_frame(client))
+            handles.append(handle)
+        self.assertEqual(handles, [0, 1])
+
+        # Wait until the server handled the subscription.
+        deadline = time.time() + 5
+        while not (s._clients and s._clients[0].handles is not None):
+            self.assertTrue(time.time() < deadline)
+            time.sleep(0.01)
+
+        # Only the subscribed channel is sent.
+        t = numpy.arange(10.0)
+        s.write([acquisition.Measurement(h, t, t * h, sr.Unit.VOLT,
+            [sr.QuantityFlag.DC]) for h in (0, 1)])
+        r, _, _ = select.select([client], [], [], 5)
+        self.assertTrue(r)
+        frame = server.recv_frame(client)
+
+        handle, unit, flags, ts, vs = server.decode(*frame)
+        self.assertEqual(handle, 1)
+        self.assertEqual(unit, sr.Unit.VOLT.id)
+        self.assertEqual(flags, sr.QuantityFlag.DC.id)
+        self.assertTrue(numpy.array_equal(ts, t))
+        self.assertTrue(numpy.array_equal(vs, t))
+
+        client.close()
+        s.close()
+        self.assertFalse(os.path.exists(address))
+
 if __name__ == '__main__':
     unittest.main()
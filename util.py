@@ -17,68 +17,186 @@
 ## along with this program; if not, see <http://www.gnu.org/licenses/>.
 ##
 
+import math
 import sigrok.core as sr
 
+_units = {
+    sr.Unit.VOLT:                   'V',
+    sr.Unit.AMPERE:                 'A',
+    sr.Unit.OHM:                   u'\u03A9',
+    sr.Unit.FARAD:                  'F',
+    sr.Unit.KELVIN:                 'K',
+    sr.Unit.CELSIUS:               u'\u00B0C',
+    sr.Unit.FAHRENHEIT:            u'\u00B0F',
+    sr.Unit.HERTZ:                  'Hz',
+    sr.Unit.PERCENTAGE:             '%',
+  # sr.Unit.BOOLEAN
+    sr.Unit.SECOND:                 's',
+    sr.Unit.SIEMENS:                'S',
+    sr.Unit.DECIBEL_MW:             'dBm',
+    sr.Unit.DECIBEL_VOLT:           'dBV',
+  # sr.Unit.UNITLESS
+    sr.Unit.DECIBEL_SPL:            'dB',
+  # sr.Unit.CONCENTRATION
+    sr.Unit.REVOLUTIONS_PER_MINUTE: 'rpm',
+    sr.Unit.VOLT_AMPERE:            'VA',
+    sr.Unit.WATT:                   'W',
+    sr.Unit.WATT_HOUR:              'Wh',
+    sr.Unit.METER_SECOND:           'm/s',
+    sr.Unit.HECTOPASCAL:            'hPa',
+    sr.Unit.HUMIDITY_293K:          '%rF',
+    sr.Unit.DEGREE:                u'\u00B0',
+    sr.Unit.HENRY:                  'H'
+}
+
+_quantities = {
+    sr.Unit.VOLT:                   'Voltage',
+    sr.Unit.AMPERE:                 'Current',
+    sr.Unit.OHM:                    'Resistance',
+    sr.Unit.FARAD:                  'Capacity',
+    sr.Unit.KELVIN:                 'Temperature',
+    sr.Unit.CELSIUS:                'Temperature',
+    sr.Unit.FAHRENHEIT:             'Temperature',
+    sr.Unit.HERTZ:                  'Frequency',
+    sr.Unit.PERCENTAGE:             'Duty Cycle',
+    sr.Unit.BOOLEAN:                'Continuity',
+    sr.Unit.SECOND:                 'Time',
+    sr.Unit.SIEMENS:                'Conductance',
+    sr.Unit.DECIBEL_MW:             'Power Ratio',
+    sr.Unit.DECIBEL_VOLT:           'Voltage Ratio',
+    sr.Unit.UNITLESS:               'Unitless Quantity',
+    sr.Unit.DECIBEL_SPL:            'Sound Pressure',
+    sr.Unit.CONCENTRATION:          'Concentration',
+    sr.Unit.REVOLUTIONS_PER_MINUTE: 'Revolutions',
+    sr.Unit.VOLT_AMPERE:            'Apparent Power',
+    sr.Unit.WATT:                   'Power',
+    sr.Unit.WATT_HOUR:              'Energy',
+    sr.Unit.METER_SECOND:           'Velocity',
+    sr.Unit.HECTOPASCAL:            'Pressure',
+    sr.Unit.HUMIDITY_293K:          'Humidity',
+    sr.Unit.DEGREE:                 'Angle',
+    sr.Unit.HENRY:                  'Inductance'
+}
+
+# The flags shown next to the unit, the first match is used.
+_mqflags = [
+    (sr.QuantityFlag.AC,            'AC'),
+    (sr.QuantityFlag.DC,            'DC')
+]
+
+# Units that are scaled with an SI prefix.
+_prefixed = set([
+    sr.Unit.VOLT,
+    sr.Unit.AMPERE,
+    sr.Unit.OHM,
+    sr.Unit.FARAD,
+    sr.Unit.HERTZ,
+    sr.Unit.SECOND,
+    sr.Unit.SIEMENS,
+    sr.Unit.VOLT_AMPERE,
+    sr.Unit.WATT,
+    sr.Unit.WATT_HOUR,
+    sr.Unit.HENRY
+])
+
+# SI prefixes by their exponent.
+_si_prefixes = {
+    -12: 'p',
+     -9: 'n',
+     -6: u'\u00B5',
+     -3: 'm',
+      0: '',
+      3: 'k',
+      6: 'M',
+      9: 'G'
+}
+
+# Number of significant digits shown for a value.
+_digits = 6
+
+# Recently formatted measurements, see 'format_measurement()'.
+_cache = {}
+_cachesize = 1024
+
 def format_unit(u):
-    units = {
-        sr.Unit.VOLT:                   'V',
-        sr.Unit.AMPERE:                 'A',
-        sr.Unit.OHM:                   u'\u03A9',
-        sr.Unit.FARAD:                  'F',
-        sr.Unit.KELVIN:                 'K',
-        sr.Unit.CELSIUS:               u'\u00B0C',
-        sr.Unit.FAHRENHEIT:            u'\u00B0F',
-        sr.Unit.HERTZ:                  'Hz',
-        sr.Unit.PERCENTAGE:             '%',
-      # sr.Unit.BOOLEAN
-        sr.Unit.SECOND:                 's',
-        sr.Unit.SIEMENS:                'S',
-        sr.Unit.DECIBEL_MW:             'dBm',
-        sr.Unit.DECIBEL_VOLT:           'dBV',
-      # sr.Unit.UNITLESS
-        sr.Unit.DECIBEL_SPL:            'dB',
-      # sr.Unit.CONCENTRATION
-        sr.Unit.REVOLUTIONS_PER_MINUTE: 'rpm',
-        sr.Unit.VOLT_AMPERE:            'VA',
-        sr.Unit.WATT:                   'W',
-        sr.Unit.WATT_HOUR:              'Wh',
-        sr.Unit.METER_SECOND:           'm/s',
-        sr.Unit.HECTOPASCAL:            'hPa',
-        sr.Unit.HUMIDITY_293K:          '%rF',
-        sr.Unit.DEGREE:                u'\u00B0',
-        sr.Unit.HENRY:                  'H'
-    }
-
-    return units.get(u, '')
+    return _units.get(u, '')
 
 def quantity_from_unit(u):
-    quantities = {
-        sr.Unit.VOLT:                   'Voltage',
-        sr.Unit.AMPERE:                 'Current',
-        sr.Unit.OHM:                    'Resistance',
-        sr.Unit.FARAD:                  'Capacity',
-        sr.Unit.KELVIN:                 'Temperature',
-        sr.Unit.CELSIUS:                'Temperature',
-        sr.Unit.FAHRENHEIT:             'Temperature',
-        sr.Unit.HERTZ:                  'Frequency',
-        sr.Unit.PERCENTAGE:             'Duty Cycle',
-        sr.Unit.BOOLEAN:                'Continuity',
-        sr.Unit.SECOND:                 'Time',
-        sr.Unit.SIEMENS:                'Conductance',
-        sr.Unit.DECIBEL_MW:             'Power Ratio',
-        sr.Unit.DECIBEL_VOLT:           'Voltage Ratio',
-        sr.Unit.UNITLESS:               'Unitless Quantity',
-        sr.Unit.DECIBEL_SPL:            'Sound Pressure',
-        sr.Unit.CONCENTRATION:          'Concentration',
-        sr.Unit.REVOLUTIONS_PER_MINUTE: 'Revolutions',
-        sr.Unit.VOLT_AMPERE:            'Apparent Power',
-        sr.Unit.WATT:                   'Power',
-        sr.Unit.WATT_HOUR:              'Energy',
-        sr.Unit.METER_SECOND:           'Velocity',
-        sr.Unit.HECTOPASCAL:            'Pressure',
-        sr.Unit.HUMIDITY_293K:          'Humidity',
-        sr.Unit.DEGREE:                 'Angle',
-        sr.Unit.HENRY:                  'Inductance'
-    }
-
-    return quantities.get(u, '')
+    return _quantities.get(u, '')
+
+def format_mqflags(mqflags):
+    for flag, text in _mqflags:
+        if flag in mqflags:
+            return text
+    return ''
+
+def format_value(value, unit=None):
+    '''Formats a value, scaled with an SI prefix if the unit allows it.
+
+    Returns a tuple of the value string and the prefix.
+    '''
+
+    if math.isinf(value):
+        return (u'\u221E', '')
+    if math.isnan(value):
+        return ('nan', '')
+
+    exp = 0
+    if value and unit in _prefixed:
+        exp = int(math.floor(math.log10(abs(value)) / 3)) * 3
+        exp = min(max(exp, min(_si_prefixes)), max(_si_prefixes))
+        value /= 10.0 ** exp
+
+    # Show a constant number of significant digits.
+    decimals = _digits - 1
+    if value:
+        decimals -= int(math.floor(math.log10(abs(value))))
+    decimals = min(max(decimals, 0), _digits - 1)
+
+    return ('{:.{}f}'.format(value, decimals), _si_prefixes[exp])
+
+def format_measurement(value, unit, mqflags):
+    '''Returns the tuple '(value, unit and flags)' of strings used to show a
+    measurement. Recently formatted measurements are taken from a cache.'''
+
+    flags = format_mqflags(mqflags)
+    key = (value, unit, flags)
+    try:
+        return _cache[key]
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable unit.
+        key = None
+
+    value_str, prefix = format_value(value, unit)
+    result = (value_str, ' '.join([prefix + format_unit(unit), flags]))
+
+    if key is not None:
+        if len(_cache) >= _cachesize:
+            _cache.clear()
+        _cache[key] = result
+    return result
+
+def format_statistics(stats, unit):
+    '''Returns the two lines of text used to show a 'RunningStatistics'
+    object of values with the unit 'unit', including the number of
+    overloads if there were any.'''
+
+    def fmt(value):
+        value_str, prefix = format_value(value, unit)
+        return u'{} {}{}'.format(value_str, prefix, format_unit(unit))
+
+    first = u''
+    if stats.minimum is not None:
+        first = u'min {}   max {}'.format(fmt(stats.minimum),
+                fmt(stats.maximum))
+
+    second = []
+    if stats.count:
+        second.append(u'mean {}   \u03C3 {}   n {}'.format(fmt(stats.mean),
+                fmt(stats.stddev), stats.count))
+    if stats.overloads:
+        second.append(u'OL {}'.format(stats.overloads))
+
+    return (first, u'   '.join(second))